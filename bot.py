@@ -2,13 +2,26 @@
 
 from aiohttp import web
 from plugins import web_server
+from plugins.route import clients as web_clients
 
 from pyrogram import Client
+from pyrogram.errors import FloodWait
 from pyrogram.enums import ParseMode
 import sys
+import asyncio
 from datetime import datetime
-from config import LOGGER, PORT, OWNER_ID, SHORT_URL, SHORT_API, SHORT_TUT
+from config import LOGGER, PORT, OWNER_ID, FSUB_CACHE_TTL, FSUB_CACHE_SIZE, BROADCAST_RATE, DELIVERY_RATE, DELIVERY_CONCURRENCY
 from helper import MongoDB
+from helper.cache import SubscriptionCache
+from helper.rate_limit import TokenBucket
+from helper.broadcast import resume_broadcasts, active_broadcasts, totals as broadcast_totals
+from helper.shortener import Shortener
+from helper.link_warmer import LinkWarmer
+from helper.auto_delete import AutoDeleteScheduler
+from helper.links import LinkChannels
+from helper.settings_cache import SettingsCache
+from helper.sysmon import SystemMonitor
+from helper.metrics import registry, instrument_handlers, telegram_calls, telegram_flood_waits
 
 version = "v1.0.0"
 
@@ -31,6 +44,10 @@ class Bot(Client):
         self.fsub = fsub
         self.owner = OWNER_ID
         self.fsub_dict = {}
+        self.fsub_cache = SubscriptionCache(FSUB_CACHE_SIZE, FSUB_CACHE_TTL)
+        self.broadcast_bucket = TokenBucket(BROADCAST_RATE)
+        self.delivery_bucket = TokenBucket(DELIVERY_RATE)
+        self.delivery_semaphore = asyncio.Semaphore(DELIVERY_CONCURRENCY)
         self.admins = admins + [OWNER_ID] if OWNER_ID not in admins else admins
         self.messages = messages
         self.auto_del = auto_del
@@ -39,14 +56,39 @@ class Bot(Client):
         self.disable_btn = disable_btn
         self.reply_text = messages.get('REPLY', 'Do not send any useless message in the bot.')
         self.mongodb = MongoDB(db_uri, db_name)
+        self.shortener = Shortener(self.mongodb)
+        self.link_warmer = LinkWarmer(self)
+        self.auto_delete = AutoDeleteScheduler(self)
+        self.link_channels = LinkChannels(self)
+        self.settings = SettingsCache(self)
+        self.sysmon = SystemMonitor(self)
         self.req_channels = []
         self.db_channels = {}  # Initialize DB channels dictionary
         self.primary_db_channel = db  # Set initial primary DB channel
+
+        # Read from existing state on every /metrics scrape
+        registry.collect("bot_auto_delete_pending", "Auto delete jobs waiting for their due time", "gauge", lambda: self.auto_delete.pending)
+        registry.collect("bot_broadcasts_active", "Broadcasts in progress", "gauge", lambda: len(active_broadcasts))
+        registry.collect(
+            "bot_broadcast_messages_total", "Broadcast messages by result since startup", "counter",
+            lambda: {result: count for result, count in broadcast_totals.items() if result not in ("total", "flood_waits")}, ("result",)
+        )
+
+    async def invoke(self, query, *args, **kwargs):
+        method = type(query).__name__
+        telegram_calls.inc(method)
+        try:
+            return await super().invoke(query, *args, **kwargs)
+        except FloodWait:
+            telegram_flood_waits.inc(method)
+            raise
     
     async def start(self):
         await super().start()
         usr_bot_me = await self.get_me()
         self.uptime = datetime.now()
+        self.mongodb.status_writes.start()
+        self.sysmon.start()
         
         # Load fsub channels from static config first
         if len(self.fsub) > 0:
@@ -123,21 +165,12 @@ class Bot(Client):
                     await self.mongodb.remove_db_channel(channel_id)
         except Exception as e:
             self.LOGGER(__name__, self.name).warning(f"Error loading DB channels: {e}")
+        # Channel indexes used by file links
+        await self.link_channels.load()
         
-        # Load shortner settings from database
-        try:
-            shortner_settings = await self.mongodb.get_shortner_settings()
-            self.short_url = shortner_settings.get('short_url', SHORT_URL)
-            self.short_api = shortner_settings.get('short_api', SHORT_API)
-            self.tutorial_link = shortner_settings.get('tutorial_link', SHORT_TUT)
-            self.shortner_enabled = shortner_settings.get('enabled', True)
-        except Exception as e:
-            self.LOGGER(__name__, self.name).warning(f"Error loading shortner settings: {e}")
-            # Set defaults from config if loading fails
-            self.short_url = SHORT_URL
-            self.short_api = SHORT_API
-            self.tutorial_link = SHORT_TUT
-            self.shortner_enabled = True
+        # Load shortner, access token and other settings from database (defaults from config if that fails)
+        await self.settings.load()
+        self.settings.start()
         
         try:
             db_channel = await self.get_chat(self.db)
@@ -164,7 +197,27 @@ class Bot(Client):
             self.LOGGER(__name__, self.name).warning(f"Failed to send restart notification to owner: {e}")
         
         self.username = usr_bot_me.username
+        self.link_warmer.start()
+        # Reload pending deletions, anything that came due while offline is deleted right away
+        await self.auto_delete.start()
+
+        # Pick up broadcasts that were interrupted by the last shutdown
+        await resume_broadcasts(self)
+
+        # Plugin handlers are registered by now, time them for /metrics
+        instrument_handlers(self)
+        web_clients.append(self)
+
     async def stop(self, *args):
+        if self in web_clients:
+            web_clients.remove(self)
+        # Flush buffered status writes before the client goes away
+        await self.mongodb.status_writes.stop()
+        await self.auto_delete.stop()
+        await self.settings.stop()
+        await self.sysmon.stop()
+        await self.link_warmer.stop()
+        await self.shortener.close()
         await super().stop()
         self.LOGGER(__name__, self.name).info("Bot stopped.")
 
@@ -1,8 +1,12 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 # Bot Configuration
 LOG_FILE_NAME = "bot.log"
+LOG_LEVEL = "INFO"  # level of the bot's own loggers
+LOG_LEVELS = {}  # per-module overrides, e.g. {"plugins.start": "DEBUG"} shows the [ACCESS DEBUG] lines
 PORT = '5010'
 OWNER_ID = 1246987713
 
@@ -32,6 +36,52 @@ DB_CHANNEL = -1003654284775  # just put channel id dont add ""
 # }
 # Auto Delete Timer (seconds)
 AUTO_DEL = 300
+AUTO_DEL_JITTER = 30  # up to this many extra seconds, so mass expiries are spread out
+DELETE_RATE = 10  # delete/edit calls per second across all auto delete jobs
+# File delivery
+DELIVERY_RATE = 25  # send calls per second for file delivery across all users
+DELIVERY_CONCURRENCY = 8  # delivery calls in flight at once across all users
+DELIVERY_USER_RATE = 10  # sustained send calls per second to one user, halved on each FloodWait in their chat
+DELIVERY_USER_BURST = 30  # calls a user can receive back to back before the rate applies
+# DB channel message cache
+MESSAGE_CACHE_SIZE = 50000  # DB channel messages kept as file_id/caption/buttons
+MESSAGE_CACHE_TTL = 3600  # seconds; edits and deletions invalidate entries right away
+# Force Sub membership cache
+FSUB_CACHE_TTL = 600  # seconds a verified membership is trusted without re-checking
+FSUB_CACHE_SIZE = 100000  # max cached (user, channel) pairs
+FSUB_CHECK_CONCURRENCY = 4  # channels checked in parallel per /start
+# Write-behind flushing for fsub/channel/join-request status writes
+STATUS_FLUSH_INTERVAL = 2  # seconds between background flushes
+STATUS_FLUSH_SIZE = 500  # flush early once this many documents are queued
+# Broadcast engine
+BROADCAST_RATE = 25  # messages per second across all broadcasts (Telegram allows ~30)
+BROADCAST_WORKERS = 10  # concurrent senders per broadcast
+BROADCAST_PAGE_SIZE = 500  # users per page; progress is saved after each page
+BROADCAST_PROGRESS_INTERVAL = 10  # seconds between status message edits
+# URL shortener client
+SHORTENER_TIMEOUT = 10  # seconds per API request
+SHORTENER_RETRIES = 2  # extra attempts on timeouts and 5xx/429 answers
+SHORTENER_CACHE_SIZE = 10000  # short links kept in memory (all of them are also stored in Mongo)
+SHORTENER_CACHE_TTL = 86400  # seconds a short link stays in memory
+SHORTENER_BREAKER_THRESHOLD = 5  # consecutive failures before the shortener is skipped
+SHORTENER_BREAKER_RESET = 60  # seconds to skip it before trying again
+LINK_WARMUP_RATE = 1  # background pre-shortening calls per second
+LINK_WARMUP_QUEUE_SIZE = 1000  # pending warm-ups; extra links are shortened on first /start instead
+# Screenshot extraction
+FFMPEG_WORKERS = 2  # FFmpeg jobs allowed to run at the same time
+SCREENSHOT_TIMEOUT = 120  # seconds before a screenshot job is killed
+STREAM_SCREENSHOTS = True  # read only the needed parts of a video over /stream instead of downloading it
+STREAM_HOST = "127.0.0.1"  # host FFmpeg uses to reach this bot's web server
+STREAM_TOKEN_TTL = 600  # seconds a /stream link stays valid
+# Settings cache
+SETTINGS_POLL_INTERVAL = 30  # seconds between checks for settings changed by another process
+# Request tracing
+TRACE_SAMPLE_RATE = 0.05  # share of /start requests that are traced (0 turns tracing off)
+TRACE_FILE = "traces.jsonl"  # one JSON line per sampled trace
+TRACE_RESERVOIR = 1000  # latest durations kept per stage for /traces percentiles
+# System monitor
+SYSMON_INTERVAL = 5  # seconds between /stats samples
+SYSMON_COUNT_INTERVAL = 300  # seconds between user count refreshes
 # Admin IDs
 ADMINS = [1246987713]
 # Bot Settings
@@ -51,18 +101,52 @@ MESSAGES = {
     "SHORT": "https://graph.org/file/8c1586a79388f0a74fa83-8c0e212b265e207a9c.jpg"
 }
 
-def LOGGER(name: str, client_name: str) -> logging.Logger:
-    logger = logging.getLogger(name)
+_log_listener = None
+_loggers = {}
+
+class _ClientNameFilter(logging.Filter):
+    """Records from outside LOGGER (pyrogram, module loggers) have no client name"""
+
+    def filter(self, record):
+        if not hasattr(record, "client_name"):
+            record.client_name = "-"
+        return True
+
+
+def setup_logging():
+    """
+    Send every log record through one queue. A single listener thread writes
+    them to the log file and the console, so logging never blocks the event loop.
+    Safe to call more than once.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        return
     formatter = logging.Formatter(
-        f"[%(asctime)s - %(levelname)s] - {client_name} - %(name)s - %(message)s",
+        "[%(asctime)s - %(levelname)s] - %(client_name)s - %(name)s - %(message)s",
         datefmt='%d-%b-%y %H:%M:%S'
     )
     file_handler = RotatingFileHandler(LOG_FILE_NAME, maxBytes=50_000_000, backupCount=10)
     file_handler.setFormatter(formatter)
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
 
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(_ClientNameFilter())
+    logging.getLogger().addHandler(queue_handler)
+    _log_listener = QueueListener(log_queue, file_handler, stream_handler)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+
+
+def LOGGER(name: str, client_name: str) -> logging.LoggerAdapter:
+    """Logger for a module of one client; created once, then served from a cache"""
+    logger = _loggers.get((name, client_name))
+    if logger is None:
+        setup_logging()
+        base = logging.getLogger(name)
+        base.setLevel(LOG_LEVELS.get(name, LOG_LEVEL))
+        logger = logging.LoggerAdapter(base, {"client_name": client_name})
+        _loggers[(name, client_name)] = logger
     return logger
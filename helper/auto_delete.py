@@ -0,0 +1,185 @@
+#(©) Codeflix_Bots - Persistent auto delete scheduler
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from pyrogram.errors import FloodWait, BadRequest, Forbidden
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from helper.rate_limit import TokenBucket
+from config import AUTO_DEL_JITTER, DELETE_RATE
+
+#===============================================================#
+
+DELETE_CHUNK = 100  # most ids Telegram accepts in one delete_messages call
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60  # seconds before a failed deletion is tried again, doubled on every failure
+MAX_RETRY_DELAY = 3600
+
+#===============================================================#
+
+def deleted_notice(bot_username, transfer_link):
+    """Text and buttons the countdown notice is edited to once the files are gone"""
+    if not transfer_link:
+        return "<b>Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ</b>", None
+    name = "• ɢᴇᴛ ғɪʟᴇs •"
+    link = f"https://t.me/{bot_username}?start={transfer_link}"
+    button = [[InlineKeyboardButton(text=name, url=link), InlineKeyboardButton(text="ᴄʟᴏsᴇ •", callback_data="close")]]
+    text = f"<b>›› Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ\n\nIғ ʏᴏᴜ ᴡᴀɴᴛ ᴛᴏ ɢᴇᴛ ᴛʜᴇ ғɪʟᴇs ᴀɢᴀɪɴ, ᴛʜᴇɴ ᴄʟɪᴄᴋ: <a href={link}>{name}</a> ʙᴜᴛᴛᴏɴ ʙᴇʟᴏᴡ ᴇʟsᴇ ᴄʟᴏsᴇ ᴛʜɪs ᴍᴇssᴀɢᴇ.</b>"
+    return text, InlineKeyboardMarkup(button)
+
+#===============================================================#
+
+class AutoDeleteScheduler:
+    """
+    Deletes sent files after the auto delete timer, even across restarts.
+
+    Every job (chat_id, message_ids, notice_id, due_at, transfer_link) is
+    stored in the `auto_delete` collection. A single loop sleeps until the
+    earliest due_at on an in-memory heap. When a job is due, all its messages
+    go in one delete_messages call, the notice is edited and the document is
+    removed. On startup every stored job is loaded again, and overdue ones run
+    immediately.
+
+    Due times get up to AUTO_DEL_JITTER seconds of random delay, so a popular
+    post doesn't expire all at once. Jobs that come due together in the same
+    chat are merged. Every API call goes through one DELETE_RATE token bucket
+    that backs off on FloodWait.
+
+    A job is only removed once its messages are deleted, or Telegram says they
+    can't be (gone, or not ours to delete). Anything else, like a FloodWait
+    that outlasts MAX_ATTEMPTS, moves the job to a later due time instead.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._running = set()
+        self.bucket = TokenBucket(DELETE_RATE)
+
+    @property
+    def pending(self) -> int:
+        """Jobs waiting for their due time"""
+        return len(self._heap)
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        try:
+            jobs = await self.client.mongodb.get_auto_delete_jobs()
+        except Exception as e:
+            jobs = []
+            self.client.LOGGER(__name__, self.client.name).warning(f"Error loading auto delete jobs: {e}")
+        # Handlers are live before start(), so jobs scheduled meanwhile are already queued and stored
+        queued = {job.get("_id") for _, _, job in self._heap}
+        jobs = [job for job in jobs if job["_id"] not in queued]
+        for job in jobs:
+            self._push(job)
+        if jobs:
+            self.client.LOGGER(__name__, self.client.name).info(f"Recovered {len(jobs)} pending auto delete jobs")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def schedule(self, chat_id: int, message_ids: list, delay: float, notice_id: int = None, transfer_link: str = None):
+        """Persist a deletion job and queue it for `delay` seconds from now"""
+        job = {
+            "chat_id": chat_id,
+            "message_ids": list(message_ids),
+            "notice_id": notice_id,
+            "transfer_link": transfer_link,
+            "due_at": datetime.now() + timedelta(seconds=delay + random.uniform(0, AUTO_DEL_JITTER)),
+        }
+        try:
+            job["_id"] = await self.client.mongodb.add_auto_delete_job(job)
+        except Exception as e:
+            # Still delete on time, it just won't survive a restart
+            self.client.LOGGER(__name__, self.client.name).warning(f"Error saving auto delete job: {e}")
+        self._push(job)
+
+    def _push(self, job: dict):
+        heapq.heappush(self._heap, (job["due_at"].timestamp(), next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            now = time.time()
+            due = {}
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                due.setdefault(job["chat_id"], []).append(job)
+            for chat_id, jobs in due.items():
+                task = asyncio.create_task(self._execute(chat_id, jobs))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if self._heap:
+                timeout = self._heap[0][0] - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _call(self, func, *args, **kwargs):
+        for _ in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                result = await func(*args, **kwargs)
+                self.bucket.recover()
+                return result
+            except FloodWait as e:
+                self.bucket.backoff(e.value)
+        raise RuntimeError(f"still flood limited after {MAX_ATTEMPTS} attempts")
+
+    async def _retry(self, jobs: list):
+        for job in jobs:
+            job["attempts"] = job.get("attempts", 0) + 1
+            delay = min(RETRY_DELAY * 2 ** (job["attempts"] - 1), MAX_RETRY_DELAY)
+            job["due_at"] = datetime.now() + timedelta(seconds=delay)
+            if job.get("_id") is not None:
+                try:
+                    await self.client.mongodb.reschedule_auto_delete_job(job["_id"], job["due_at"], job["attempts"])
+                except Exception as e:
+                    # The stored job is overdue and still runs after a restart
+                    self.client.LOGGER(__name__, self.client.name).warning(f"Error rescheduling auto delete job: {e}")
+            self._push(job)
+
+    async def _execute(self, chat_id: int, jobs: list):
+        message_ids = [message_id for job in jobs for message_id in job["message_ids"]]
+        for i in range(0, len(message_ids), DELETE_CHUNK):
+            try:
+                await self._call(self.client.delete_messages, chat_id, message_ids[i:i + DELETE_CHUNK])
+            except (BadRequest, Forbidden) as e:
+                # Already gone or not deletable by us, trying again won't change that
+                self.client.LOGGER(__name__, self.client.name).warning(f"Can't delete messages in {chat_id}: {e}")
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"Error deleting messages in {chat_id}, retrying later: {e}")
+                # Deleting the chunks that did go through again is harmless
+                return await self._retry(jobs)
+
+        for job in jobs:
+            if job.get("notice_id"):
+                text, reply_markup = deleted_notice(self.client.username, job.get("transfer_link"))
+                try:
+                    await self._call(self.client.edit_message_text, chat_id, job["notice_id"], text, reply_markup=reply_markup, disable_web_page_preview=True)
+                except Exception as e:
+                    self.client.LOGGER(__name__, self.client.name).warning(f"Error updating notification message: {e}")
+
+            if job.get("_id") is not None:
+                try:
+                    await self.client.mongodb.remove_auto_delete_job(job["_id"])
+                except Exception as e:
+                    self.client.LOGGER(__name__, self.client.name).warning(f"Error removing auto delete job: {e}")
@@ -0,0 +1,266 @@
+#(©) Codeflix_Bots - Broadcast engine
+
+import asyncio
+import time
+from collections import deque
+from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated
+from config import BROADCAST_WORKERS, BROADCAST_PAGE_SIZE, BROADCAST_PROGRESS_INTERVAL
+
+#===============================================================#
+
+MAX_ATTEMPTS = 3  # copy attempts per user before counting it as unsuccessful
+PIN_DELAY = 1  # Telegram allows about one message per second inside a single chat
+
+# Keeps running broadcast tasks referenced until they finish
+_running = set()
+
+# Broadcasts in progress, by job id, and counters summed over every broadcast since startup
+active_broadcasts = {}
+totals = {"total": 0, "successful": 0, "blocked": 0, "deleted": 0, "unsuccessful": 0, "flood_waits": 0}
+
+#===============================================================#
+
+def render_status(counts: dict, title: str = "Broadcast Completed") -> str:
+    return f"""<blockquote><b><u>{title}</u></b></blockquote>
+<blockquote expandable><b>Total Users :</b> <code>{counts['total']}</code>
+<b>Successful :</b> <code>{counts['successful']}</code>
+<b>Blocked Users :</b> <code>{counts['blocked']}</code>
+<b>Deleted Accounts :</b> <code>{counts['deleted']}</code>
+<b>Unsuccessful :</b> <code>{counts['unsuccessful']}</code></blockquote>"""
+
+
+def _format_eta(seconds) -> str:
+    if seconds is None:
+        return "-"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m {seconds}s" if hours else f"{minutes}m {seconds}s"
+
+
+def render_progress(stats: dict) -> str:
+    counts = stats["counts"]
+    failed = counts["blocked"] + counts["deleted"] + counts["unsuccessful"]
+    backoff = f"\n<b>FloodWait Backoff :</b> <code>{stats['backoff']:.0f}s</code>" if stats["backoff"] else ""
+    return f"""<blockquote><b><u>Broadcasting...</u></b></blockquote>
+<blockquote><b>Progress :</b> <code>{counts['total']}/{stats['total_users']}</code>
+<b>Sent :</b> <code>{counts['successful']}</code>
+<b>Failed :</b> <code>{failed}</code> (<code>{counts['blocked']}</code> blocked, <code>{counts['deleted']}</code> deleted)
+<b>Speed :</b> <code>{stats['rate']:.1f} msg/s</code>
+<b>ETA :</b> <code>{_format_eta(stats['eta'])}</code>{backoff}</blockquote>"""
+
+
+def broadcast_stats() -> dict:
+    """Counters for every running broadcast plus lifetime totals"""
+    return {
+        "active": [broadcast.stats() for broadcast in active_broadcasts.values()],
+        "totals": dict(totals),
+    }
+
+#===============================================================#
+
+class Broadcast:
+    """
+    Copies one message to every user with BROADCAST_WORKERS concurrent senders.
+
+    Every send takes a token from the bot's shared broadcast bucket, and a
+    FloodWait pauses the bucket and slows it down. Users are read in _id-ordered
+    pages. After each page finishes, the last user id, the counters and any
+    newly found dead users are saved to the job document, so a restarted job
+    resumes at the next page. Blocked and deleted users are removed in one
+    batch when the job finishes.
+    """
+
+    def __init__(self, client, job: dict):
+        self.client = client
+        self.job = job
+        self.bucket = client.broadcast_bucket
+        self.counts = {"total": 0, "successful": 0, "blocked": 0, "deleted": 0, "unsuccessful": 0}
+        self.counts.update(job.get("counts") or {})
+        self.dead_users = []
+        self.total_users = 0
+        self.started_at = time.monotonic()
+        # (time, processed) samples, so speed reflects the last minute rather than the whole run
+        self._samples = deque([(self.started_at, self.counts["total"])], maxlen=7)
+
+    def rate(self) -> float:
+        now = time.monotonic()
+        then, processed = self._samples[0]
+        return (self.counts["total"] - processed) / (now - then) if now > then else 0.0
+
+    def stats(self) -> dict:
+        rate = self.rate()
+        remaining = max(self.total_users - self.counts["total"], 0)
+        return {
+            "job_id": str(self.job["_id"]),
+            "pin": bool(self.job.get("pin")),
+            "counts": dict(self.counts),
+            "total_users": self.total_users,
+            "rate": rate,
+            "eta": remaining / rate if rate else None,
+            "backoff": self.bucket.backoff_remaining,
+            "send_rate_limit": self.bucket.rate,
+            "elapsed": time.monotonic() - self.started_at,
+        }
+
+    async def _copy(self, chat_id):
+        for _ in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                sent = await self.client.copy_message(chat_id, self.job["from_chat_id"], self.job["message_id"])
+                self.bucket.recover()
+                return sent
+            except FloodWait as e:
+                totals["flood_waits"] += 1
+                self.bucket.backoff(e.value)
+        return None
+
+    async def _pin(self, chat_id, message_id):
+        await asyncio.sleep(PIN_DELAY)
+        for _ in range(MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            try:
+                return await self.client.pin_chat_message(chat_id=chat_id, message_id=message_id, both_sides=True)
+            except FloodWait as e:
+                totals["flood_waits"] += 1
+                self.bucket.backoff(e.value)
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"Failed to pin message for {chat_id}: {e}")
+                return None
+
+    async def _send(self, chat_id) -> str:
+        try:
+            sent = await self._copy(chat_id)
+        except UserIsBlocked:
+            return "blocked"
+        except InputUserDeactivated:
+            return "deleted"
+        except Exception as e:
+            self.client.LOGGER(__name__, self.client.name).warning(f"Failed to send message to {chat_id}: {e}")
+            return "unsuccessful"
+        if sent is None:
+            return "unsuccessful"
+        if self.job.get("pin"):
+            await self._pin(chat_id, sent.id)
+        return "successful"
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            chat_id = await queue.get()
+            try:
+                result = await self._send(chat_id)
+                self.counts[result] += 1
+                self.counts["total"] += 1
+                totals[result] += 1
+                totals["total"] += 1
+                if result in ("blocked", "deleted"):
+                    self.dead_users.append(chat_id)
+            finally:
+                queue.task_done()
+
+    async def run(self) -> dict:
+        db = self.client.mongodb
+        job_id = self.job["_id"]
+        dead_users = list(self.job.get("dead_users") or [])
+
+        # Estimated count is enough for an ETA and doesn't scan the collection
+        self.total_users = await db.count_users(exact=False)
+        active_broadcasts[job_id] = self
+
+        queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(BROADCAST_WORKERS)]
+        workers.append(asyncio.create_task(self._progress()))
+        try:
+            async for page in db.iter_user_id_pages(BROADCAST_PAGE_SIZE, after=self.job.get("last_user_id")):
+                for chat_id in page:
+                    await queue.put(chat_id)
+                await queue.join()
+
+                new_dead, self.dead_users = self.dead_users, []
+                dead_users.extend(new_dead)
+                await db.save_broadcast_progress(job_id, page[-1], self.counts, new_dead)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            active_broadcasts.pop(job_id, None)
+
+        if dead_users:
+            await db.del_users(dead_users)
+        await db.finish_broadcast(job_id, self.counts)
+        await self._report(render_status(self.counts))
+        return self.counts
+
+    async def _progress(self):
+        last_text = None
+        shown_backoff = False
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            self._samples.append((time.monotonic(), self.counts["total"]))
+            text = render_progress(self.stats())
+            if text == last_text:
+                continue
+            if self.bucket.backoff_remaining:
+                # The bucket is paused, so show the backoff with a single edit that
+                # doesn't wait for it, then leave the status alone until it's over
+                if shown_backoff:
+                    continue
+                shown_backoff = True
+            else:
+                shown_backoff = False
+                # The edit goes through the send bucket so it counts against the same budget
+                await self.bucket.acquire()
+            await self._report(text)
+            last_text = text
+
+    async def _report(self, text: str):
+        try:
+            await self.client.edit_message_text(self.job["admin_chat_id"], self.job["status_message_id"], text)
+        except FloodWait as e:
+            totals["flood_waits"] += 1
+            self.bucket.backoff(e.value)
+        except Exception as e:
+            self.client.LOGGER(__name__, self.client.name).warning(f"Could not update broadcast status: {e}")
+
+#===============================================================#
+
+def start_broadcast(client, job: dict) -> asyncio.Task:
+    """Run a broadcast job in the background"""
+    broadcast = Broadcast(client, job)
+    task = asyncio.create_task(broadcast.run())
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    task.add_done_callback(lambda task: _check_result(broadcast, task))
+    return task
+
+
+def _check_result(broadcast: Broadcast, task: asyncio.Task):
+    # Cancelled means shutdown: the job stays "running" and is resumed on the next start
+    if task.cancelled() or task.exception() is None:
+        return
+    error = task.exception()
+    broadcast.client.LOGGER(__name__, broadcast.client.name).error(
+        f"Broadcast {broadcast.job['_id']} failed", exc_info=(type(error), error, error.__traceback__)
+    )
+    cleanup = asyncio.create_task(_mark_failed(broadcast, error))
+    _running.add(cleanup)
+    cleanup.add_done_callback(_running.discard)
+
+
+async def _mark_failed(broadcast: Broadcast, error: BaseException):
+    try:
+        await broadcast.client.mongodb.fail_broadcast(broadcast.job["_id"], broadcast.counts, repr(error))
+    except Exception as e:
+        broadcast.client.LOGGER(__name__, broadcast.client.name).warning(f"Could not mark broadcast {broadcast.job['_id']} as failed: {e}")
+    await broadcast._report(render_status(broadcast.counts, "Broadcast Failed"))
+
+
+async def resume_broadcasts(client):
+    """Restart broadcast jobs that were interrupted by a restart"""
+    try:
+        jobs = await client.mongodb.get_running_broadcasts()
+    except Exception as e:
+        client.LOGGER(__name__, client.name).warning(f"Error loading unfinished broadcasts: {e}")
+        return
+    for job in jobs:
+        client.LOGGER(__name__, client.name).info(f"Resuming broadcast {job['_id']} after user {job.get('last_user_id')}")
+        start_broadcast(client, job)
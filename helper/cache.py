@@ -0,0 +1,77 @@
+#(©) Codeflix_Bots - In-memory caches
+
+import time
+from collections import OrderedDict
+from pyrogram.enums import ChatMemberStatus
+
+#===============================================================#
+
+_MISSING = object()
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+#===============================================================#
+
+class SubscriptionCache(TTLCache):
+    """
+    Remembers which (user, channel) pairs already passed the force-sub check.
+    Only admitting statuses are stored, so a miss always falls back to a live check.
+    """
+
+    ADMITTED = {ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER}
+
+    def mark(self, user_id: int, channel_id: int, status):
+        if status in self.ADMITTED:
+            self.set((user_id, channel_id), status)
+        else:
+            self.forget(user_id, channel_id)
+
+    def forget(self, user_id: int, channel_id: int):
+        self.pop((user_id, channel_id))
+
+    def lookup(self, user_id: int, channel_id: int):
+        return self.get((user_id, channel_id))
+
+    def is_subscribed(self, user_id: int, channel_ids) -> bool:
+        """True only if every channel has a fresh admitting entry for this user."""
+        channel_ids = list(channel_ids)
+        return bool(channel_ids) and all(
+            self.get((user_id, channel_id)) is not None for channel_id in channel_ids
+        )
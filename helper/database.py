@@ -1,5 +1,11 @@
+import asyncio
 import motor.motor_asyncio
+from pymongo import UpdateOne, DeleteOne, ReplaceOne, ReturnDocument
 from datetime import datetime, timedelta
+from config import STATUS_FLUSH_INTERVAL, STATUS_FLUSH_SIZE
+from helper.write_behind import WriteBehindQueue
+from helper.tracing import trace_methods
+from helper.metrics import observe_methods, mongo_seconds
 
 class MongoDB:
     _instances = {}
@@ -14,6 +20,11 @@ class MongoDB:
             instance.premium_users = instance.db['pros']
             instance.fsub_status = instance.db['fsub_status']  # New collection for fsub status tracking
             instance.request_sub = instance.db['request_sub']  # New collection for join request tracking
+            instance.broadcasts = instance.db['broadcasts']  # Resumable broadcast jobs
+            instance.short_links = instance.db['short_links']  # Shortened link cache
+            instance.auto_delete = instance.db['auto_delete']  # Pending auto delete jobs
+            instance.files = instance.db['files']  # Index of DB channel messages
+            instance.status_writes = WriteBehindQueue(instance, STATUS_FLUSH_SIZE, STATUS_FLUSH_INTERVAL)  # Buffered status bookkeeping
             cls._instances[(uri, db_name)] = instance
         return cls._instances[(uri, db_name)]
 
@@ -29,17 +40,12 @@ class MongoDB:
         return data.get("channels", []) if data else []
 
     async def add_channel_user(self, channel_id: int, user_id: int):
-        await self.channel_data.update_one(
-            {"_id": channel_id},
-            {"$addToSet": {"users": user_id}},
-            upsert=True
-        )
+        """Queued write-behind; returns without waiting on Mongo"""
+        self.status_writes.put(*self.channel_user_op(channel_id, user_id, True))
 
     async def remove_channel_user(self, channel_id: int, user_id: int):
-        await self.channel_data.update_one(
-            {"_id": channel_id},
-            {"$pull": {"users": user_id}}
-        )
+        """Queued write-behind; returns without waiting on Mongo"""
+        self.status_writes.put(*self.channel_user_op(channel_id, user_id, False))
 
     async def get_channel_users(self, channel_id: int) -> list[int]:
         doc = await self.channel_data.find_one({"_id": channel_id})
@@ -108,13 +114,72 @@ class MongoDB:
     async def add_user(self, user_id: int, ban: bool = False):
         await self.user_data.insert_one({'_id': user_id, 'ban': ban})
 
+    async def get_user_context(self, user_id: int) -> dict:
+        """Add the user if new and fetch their ban, premium and access token state in one round of parallel queries"""
+        now = datetime.now()
+        user, pro, access = await asyncio.gather(
+            # Returns the document as it was before, so None means the user was just added
+            self.user_data.find_one_and_update({'_id': user_id}, {'$setOnInsert': {'ban': False}}, upsert=True),
+            self.premium_users.find_one({'_id': user_id}),
+            self.user_data.find_one({'_id': f"access_{user_id}"}),
+        )
+        access_expiry = access.get("expiry") if access else None
+        pro_expiry = pro.get('expiry_date') if pro else None
+        return {
+            "is_new": user is None,
+            "banned": user.get('ban', False) if user else False,
+            "is_pro": pro is not None and (pro_expiry is None or pro_expiry > now),  # same rules as is_pro
+            "pro_expiry": pro_expiry,
+            "access_expiry": access_expiry,
+            "has_access": access_expiry is not None and access_expiry > now,
+        }
+
+    # Real users are the numeric _ids; this skips the settings docs, the `_id: 1` channels doc and access_{uid} tokens
+    USER_ID_FILTER = {'$type': ['int', 'long'], '$ne': 1}
+
+    async def iter_user_id_pages(self, page_size: int = 1000, after: int = None):
+        """Yield real user ids as lists of up to page_size, in ascending _id order, resuming after `after` if given"""
+        last_id = after
+        while True:
+            id_filter = dict(self.USER_ID_FILTER)
+            if last_id is not None:
+                id_filter['$gt'] = last_id
+            cursor = self.user_data.find({'_id': id_filter}, {'_id': 1}).sort('_id', 1).limit(page_size)
+            page = [doc['_id'] async for doc in cursor]
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]
+
+    async def iter_user_ids(self, page_size: int = 1000):
+        """Stream real user ids one by one without holding the whole userbase in memory"""
+        async for page in self.iter_user_id_pages(page_size):
+            for user_id in page:
+                yield user_id
+
+    async def count_users(self, exact: bool = True) -> int:
+        """Count real users; exact=False uses the collection metadata estimate (includes non-user docs)"""
+        if not exact:
+            return await self.user_data.estimated_document_count()
+        return await self.user_data.count_documents({'_id': self.USER_ID_FILTER})
+
     async def full_userbase(self) -> list[int]:
-        cursor = self.user_data.find()
-        return [doc['_id'] async for doc in cursor]
+        """Materialise every user id - prefer iter_user_ids/count_users for large userbases"""
+        return [user_id async for user_id in self.iter_user_ids()]
 
     async def del_user(self, user_id: int):
         await self.user_data.delete_one({'_id': user_id})
 
+    async def del_users(self, user_ids: list[int], chunk_size: int = 1000) -> int:
+        """Delete many users at once, in chunks to keep each query small"""
+        deleted = 0
+        for i in range(0, len(user_ids), chunk_size):
+            result = await self.user_data.delete_many({'_id': {'$in': user_ids[i:i + chunk_size]}})
+            deleted += result.deleted_count
+        return deleted
+
     async def ban_user(self, user_id: int):
         await self.user_data.update_one({'_id': user_id}, {'$set': {'ban': True}})
 
@@ -125,6 +190,42 @@ class MongoDB:
         user = await self.user_data.find_one({'_id': user_id})
         return user.get('ban', False) if user else False
 
+    # ✅ BROADCAST JOB FUNCTIONS
+
+    async def create_broadcast(self, job: dict):
+        """Store a new broadcast job and return its id"""
+        job.setdefault("status", "running")
+        job.setdefault("last_user_id", None)
+        job.setdefault("dead_users", [])
+        job.setdefault("started_at", datetime.now())
+        result = await self.broadcasts.insert_one(job)
+        return result.inserted_id
+
+    async def save_broadcast_progress(self, job_id, last_user_id: int, counts: dict, new_dead_users: list[int]):
+        """Checkpoint a broadcast after a fully processed page of users"""
+        update = {"$set": {"last_user_id": last_user_id, "counts": counts, "updated_at": datetime.now()}}
+        if new_dead_users:
+            update["$push"] = {"dead_users": {"$each": new_dead_users}}
+        await self.broadcasts.update_one({"_id": job_id}, update)
+
+    async def finish_broadcast(self, job_id, counts: dict):
+        """Mark a broadcast as done and drop its dead user list"""
+        await self.broadcasts.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "done", "counts": counts, "finished_at": datetime.now(), "dead_users": []}}
+        )
+
+    async def fail_broadcast(self, job_id, counts: dict, error: str):
+        """Mark a broadcast as failed so it isn't resumed or shown as running"""
+        await self.broadcasts.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "failed", "counts": counts, "error": error, "finished_at": datetime.now()}}
+        )
+
+    async def get_running_broadcasts(self) -> list:
+        """Get broadcast jobs that were interrupted before finishing"""
+        return [job async for job in self.broadcasts.find({"status": "running"})]
+
     # ✅ FSUB CHANNELS FUNCTIONS
 
     async def set_fsub_channels(self, fsub_data: dict):
@@ -161,6 +262,7 @@ class MongoDB:
             {"$set": {"settings": shortner_data}},
             upsert=True
         )
+        return await self.bump_settings_version()
 
     async def get_shortner_settings(self) -> dict:
         """Get shortner settings from database"""
@@ -171,7 +273,7 @@ class MongoDB:
         """Update a single shortner setting"""
         current_data = await self.get_shortner_settings()
         current_data[key] = value
-        await self.set_shortner_settings(current_data)
+        return await self.set_shortner_settings(current_data)
 
     async def get_shortner_status(self) -> bool:
         """Get shortner on/off status"""
@@ -182,16 +284,66 @@ class MongoDB:
         """Set shortner on/off status"""
         await self.update_shortner_setting('enabled', enabled)
 
-    # ✅ FSUB STATUS COLLECTION FUNCTIONS
+    # ✅ SHORT LINK CACHE FUNCTIONS
 
-    async def update_fsub_status(self, user_id: int, channel_id: int, status: str):
-        """Update user's subscription status for a specific channel"""
-        await self.fsub_status.update_one(
-            {"user_id": user_id, "channel_id": channel_id},
-            {"$set": {"status": status, "last_updated": datetime.now()}},
+    async def get_short_link(self, short_url: str, api_hash: str, url: str):
+        """Get a previously shortened link for this shortener domain and API key"""
+        data = await self.short_links.find_one({"_id": f"{short_url}|{api_hash}|{url}"})
+        return data.get("short") if data else None
+
+    async def save_short_link(self, short_url: str, api_hash: str, url: str, short: str):
+        """Remember a shortened link so it is never requested twice"""
+        await self.short_links.update_one(
+            {"_id": f"{short_url}|{api_hash}|{url}"},
+            {"$set": {"short": short, "created_at": datetime.now()}},
             upsert=True
         )
 
+    # ✅ FILE INDEX FUNCTIONS
+
+    async def save_files(self, docs: list):
+        """Insert or replace indexed DB channel messages"""
+        await self.files.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+
+    async def get_files(self, channel_id: int, message_ids: list) -> list:
+        """Get indexed messages of a DB channel by message id"""
+        keys = [f"{channel_id}:{message_id}" for message_id in message_ids]
+        return [doc async for doc in self.files.find({"_id": {"$in": keys}})]
+
+    async def remove_files(self, channel_id: int, message_ids: list):
+        """Drop deleted DB channel messages from the index"""
+        keys = [f"{channel_id}:{message_id}" for message_id in message_ids]
+        await self.files.delete_many({"_id": {"$in": keys}})
+
+    async def count_files(self, channel_id: int = None) -> int:
+        """Number of indexed messages, optionally for one channel"""
+        return await self.files.count_documents({"channel_id": channel_id} if channel_id else {})
+
+    # ✅ AUTO DELETE JOB FUNCTIONS
+
+    async def add_auto_delete_job(self, job: dict):
+        """Store a pending auto delete job and return its id"""
+        result = await self.auto_delete.insert_one(dict(job))
+        return result.inserted_id
+
+    async def get_auto_delete_jobs(self) -> list:
+        """Get all pending auto delete jobs, earliest first"""
+        return [job async for job in self.auto_delete.find({}).sort("due_at", 1)]
+
+    async def reschedule_auto_delete_job(self, job_id, due_at: datetime, attempts: int):
+        """Move a failed auto delete job to a later due time"""
+        await self.auto_delete.update_one({"_id": job_id}, {"$set": {"due_at": due_at, "attempts": attempts}})
+
+    async def remove_auto_delete_job(self, job_id):
+        """Remove an auto delete job once it has run"""
+        await self.auto_delete.delete_one({"_id": job_id})
+
+    # ✅ FSUB STATUS COLLECTION FUNCTIONS
+
+    async def update_fsub_status(self, user_id: int, channel_id: int, status: str):
+        """Update user's subscription status for a specific channel (queued write-behind)"""
+        self.status_writes.put(*self.fsub_status_op(user_id, channel_id, status))
+
     async def get_fsub_status(self, user_id: int, channel_id: int) -> str:
         """Get user's subscription status for a specific channel"""
         doc = await self.fsub_status.find_one({"user_id": user_id, "channel_id": channel_id})
@@ -214,10 +366,48 @@ class MongoDB:
         cutoff_date = datetime.now() - timedelta(days=days)
         await self.fsub_status.delete_many({"last_updated": {"$lt": cutoff_date}})
 
+    # ✅ BULK STATUS WRITES
+    # Each *_op helper returns (collection_name, document_key, operation), ready for status_writes.put
+
+    def fsub_status_op(self, user_id: int, channel_id: int, status: str):
+        return "fsub_status", (user_id, channel_id), UpdateOne(
+            {"user_id": user_id, "channel_id": channel_id},
+            {"$set": {"status": status, "last_updated": datetime.now()}},
+            upsert=True
+        )
+
+    def channel_user_op(self, channel_id: int, user_id: int, present: bool):
+        if present:
+            op = UpdateOne({"_id": channel_id}, {"$addToSet": {"users": user_id}}, upsert=True)
+        else:
+            op = UpdateOne({"_id": channel_id}, {"$pull": {"users": user_id}})
+        return "channel_data", (channel_id, user_id), op
+
+    def join_request_status_op(self, user_id: int, channel_id: int, status: str):
+        return "request_sub", (user_id, channel_id), UpdateOne(
+            {"user_id": user_id, "channel_id": channel_id},
+            {"$set": {"status": status, "last_updated": datetime.now()}}
+        )
+
+    def remove_join_request_op(self, user_id: int, channel_id: int):
+        return "request_sub", (user_id, channel_id), DeleteOne({"user_id": user_id, "channel_id": channel_id})
+
+    async def apply_status_ops(self, ops: list):
+        """Run (collection_name, operation) pairs as one unordered bulk_write per collection"""
+        grouped = {}
+        for name, op in ops:
+            grouped.setdefault(name, []).append(op)
+        await asyncio.gather(*(
+            getattr(self, name).bulk_write(collection_ops, ordered=False)
+            for name, collection_ops in grouped.items()
+        ))
+
     # ✅ REQUEST SUB COLLECTION FUNCTIONS
 
     async def add_join_request(self, user_id: int, channel_id: int, request_id: int = None):
         """Record a join request submission"""
+        # A queued delete/status write from an earlier request must not land after this one
+        await self.status_writes.discard(*self.remove_join_request_op(user_id, channel_id)[:2])
         await self.request_sub.update_one(
             {"user_id": user_id, "channel_id": channel_id},
             {"$set": {
@@ -230,11 +420,8 @@ class MongoDB:
         )
 
     async def update_join_request_status(self, user_id: int, channel_id: int, status: str):
-        """Update join request status (pending, approved, rejected)"""
-        await self.request_sub.update_one(
-            {"user_id": user_id, "channel_id": channel_id},
-            {"$set": {"status": status, "last_updated": datetime.now()}}
-        )
+        """Update join request status (pending, approved, rejected) - queued write-behind"""
+        self.status_writes.put(*self.join_request_status_op(user_id, channel_id, status))
 
     async def get_join_request_status(self, user_id: int, channel_id: int) -> str:
         """Get join request status"""
@@ -283,21 +470,29 @@ class MongoDB:
             print(f"Database cleanup error: {e}")
             return False
 
+    async def _delete_orphans(self, collection, batch_size: int = 1000):
+        """Delete docs of `collection` whose user_id has no user document, joined server-side"""
+        pipeline = [
+            {"$lookup": {"from": self.user_data.name, "localField": "user_id", "foreignField": "_id", "as": "user"}},
+            {"$match": {"user": {"$size": 0}}},
+            {"$project": {"_id": 1}},
+        ]
+        batch = []
+        async for doc in collection.aggregate(pipeline):
+            batch.append(doc["_id"])
+            if len(batch) >= batch_size:
+                await collection.delete_many({"_id": {"$in": batch}})
+                batch = []
+        if batch:
+            await collection.delete_many({"_id": {"$in": batch}})
+
     async def cleanup_orphaned_records(self):
         """Clean up records that are no longer valid"""
         try:
-            # Remove fsub status records for users who no longer exist
-            users = await self.full_userbase()
-            user_ids_set = set(users)
-            
-            # Clean fsub_status collection
-            async for doc in self.fsub_status.find({"user_id": {"$nin": users}}):
-                await self.fsub_status.delete_one({"_id": doc["_id"]})
-            
-            # Clean request_sub collection
-            async for doc in self.request_sub.find({"user_id": {"$nin": users}}):
-                await self.request_sub.delete_one({"_id": doc["_id"]})
-                
+            # Remove fsub status and join request records for users who no longer exist,
+            # without loading the userbase into memory
+            await self._delete_orphans(self.fsub_status)
+            await self._delete_orphans(self.request_sub)
             return True
         except Exception as e:
             print(f"Error cleaning orphaned records: {e}")
@@ -621,6 +816,21 @@ class MongoDB:
             return not current_status
         return None
 
+    # ✅ LINK CHANNEL FUNCTIONS
+
+    async def get_link_channels(self) -> dict:
+        """Get the channel id -> link index table"""
+        data = await self.user_data.find_one({"_id": "link_channels"})
+        return data.get("channels", {}) if data else {}
+
+    async def set_link_channel(self, channel_id: int, index: int):
+        """Store the link index of a DB channel"""
+        await self.user_data.update_one(
+            {"_id": "link_channels"},
+            {"$set": {f"channels.{channel_id}": index}},
+            upsert=True
+        )
+
     # ✅ BOT SETTINGS FUNCTIONS
 
     async def set_bot_settings(self, settings_data: dict):
@@ -630,6 +840,7 @@ class MongoDB:
             {"$set": {"settings": settings_data}},
             upsert=True
         )
+        return await self.bump_settings_version()
 
     async def get_bot_settings(self) -> dict:
         """Get bot settings from database"""
@@ -640,7 +851,7 @@ class MongoDB:
         """Update a single bot setting"""
         current_data = await self.get_bot_settings()
         current_data[key] = value
-        await self.set_bot_settings(current_data)
+        return await self.set_bot_settings(current_data)
 
     async def get_bot_setting(self, key: str, default=None):
         """Get a single bot setting with default fallback"""
@@ -656,6 +867,7 @@ class MongoDB:
             {"$set": {"messages": messages_data}},
             upsert=True
         )
+        return await self.bump_settings_version()
 
     async def get_messages_settings(self) -> dict:
         """Get messages settings from database"""
@@ -666,7 +878,7 @@ class MongoDB:
         """Update a single message setting"""
         current_data = await self.get_messages_settings()
         current_data[key] = value
-        await self.set_messages_settings(current_data)
+        return await self.set_messages_settings(current_data)
 
     async def get_message_setting(self, key: str, default: str = ""):
         """Get a single message setting with default fallback"""
@@ -682,6 +894,7 @@ class MongoDB:
             {"$set": {"admins": admins_list}},
             upsert=True
         )
+        return await self.bump_settings_version()
 
     async def get_admins_list(self) -> list:
         """Get admins list from database"""
@@ -722,26 +935,50 @@ class MongoDB:
     async def load_all_settings(self) -> dict:
         """Load all settings in a single call for efficiency"""
         try:
-            bot_settings = await self.get_bot_settings()
-            messages = await self.get_messages_settings()
-            admins = await self.get_admins_list()
-            shortner_settings = await self.get_shortner_settings()
+            version, bot_settings, messages, admins, shortner_settings, access_token_settings = await asyncio.gather(
+                self.get_settings_version(),
+                self.get_bot_settings(),
+                self.get_messages_settings(),
+                self.get_admins_list(),
+                self.get_shortner_settings(),
+                self.get_access_token_settings(),
+            )
             
             return {
+                "version": version,
                 "bot_settings": bot_settings,
                 "messages": messages,
                 "admins": admins,
-                "shortner_settings": shortner_settings
+                "shortner_settings": shortner_settings,
+                "access_token_settings": access_token_settings
             }
         except Exception as e:
+            # version None tells a reload to keep what it already has
             print(f"Error loading all settings: {e}")
             return {
+                "version": None,
                 "bot_settings": {},
                 "messages": {},
                 "admins": [],
-                "shortner_settings": {}
+                "shortner_settings": {},
+                "access_token_settings": {"enabled": False, "validity_hours": 12}
             }
 
+    async def bump_settings_version(self) -> int:
+        """Tell other processes that a settings document changed; returns the new version"""
+        data = await self.user_data.find_one_and_update(
+            {"_id": "settings_version"},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return data["version"]
+
+    async def get_settings_version(self) -> int:
+        """Counter bumped on every settings write"""
+        data = await self.user_data.find_one({"_id": "settings_version"})
+        return data.get("version", 0) if data else 0
+
     # ✅ ACCESS TOKEN FUNCTIONS
 
     async def set_access_token_settings(self, settings_data: dict):
@@ -751,6 +988,7 @@ class MongoDB:
             {"$set": {"settings": settings_data}},
             upsert=True
         )
+        return await self.bump_settings_version()
 
     async def get_access_token_settings(self) -> dict:
         """Get access token settings from database"""
@@ -764,7 +1002,7 @@ class MongoDB:
         """Update a single access token setting"""
         current_data = await self.get_access_token_settings()
         current_data[key] = value
-        await self.set_access_token_settings(current_data)
+        return await self.set_access_token_settings(current_data)
 
     async def grant_user_access(self, user_id: int, hours: int):
         """Grant temporary access to a user for specified hours"""
@@ -825,3 +1063,9 @@ class MongoDB:
             "_id": {"$regex": "^access_"}
         })
         return result.deleted_count
+
+
+# Every query shows up as a mongo.<method> span in sampled /start traces
+trace_methods(MongoDB, "mongo")
+# ... and in bot_mongo_op_seconds on /metrics
+observe_methods(MongoDB, mongo_seconds)
@@ -0,0 +1,134 @@
+#(©) Codeflix_Bots - File delivery pipeline
+
+from pyrogram.errors import FloodWait
+from helper.cache import TTLCache
+from helper.rate_limit import TokenBucket
+from config import DELIVERY_USER_RATE, DELIVERY_USER_BURST
+
+#===============================================================#
+
+MAX_ATTEMPTS = 3
+
+# One bucket per recipient, dropped after a few idle minutes
+_user_buckets = TTLCache(maxsize=10000, ttl=300)
+
+#===============================================================#
+
+def render_caption(client, msg) -> str:
+    """Caption a DB channel message is delivered with"""
+    if bool(client.messages.get('CAPTION', '')) and msg.is_document:
+        return client.messages.get('CAPTION', '').format(
+            previouscaption=msg.caption_html or msg.file_name
+        )
+    return msg.caption_html
+
+
+def plan_segments(client, messages) -> list:
+    """
+    Split CachedMessages into ordered send segments:
+      album - one media group, sent with send_media_group from the cached file ids
+      copy  - anything else, sent one by one with send_cached_media / send_message
+
+    Nothing is forwarded: both kinds are built from the cached file id,
+    caption and buttons, so the DB channel is never read while delivering.
+    """
+    segments = []
+    for msg in messages:
+        caption = render_caption(client, msg)
+        # send_media_group can't carry buttons, so files that have them are copied
+        buttons = msg.reply_markup is not None and not client.disable_btn
+        kind = "album" if msg.media_group_id and not buttons and msg.input_media(caption) else "copy"
+
+        last = segments[-1] if segments else None
+        if last and kind == "album" and last["kind"] == "album" and last["chat_id"] == msg.chat_id \
+           and last["messages"][0].media_group_id == msg.media_group_id:
+            last["messages"].append(msg)
+            last["captions"].append(caption)
+            continue
+        segments.append({"kind": kind, "chat_id": msg.chat_id, "messages": [msg], "captions": [caption]})
+    return segments
+
+#===============================================================#
+
+def _user_bucket(user_id: int) -> TokenBucket:
+    bucket = _user_buckets.get(user_id)
+    if bucket is None:
+        bucket = TokenBucket(DELIVERY_USER_RATE, capacity=DELIVERY_USER_BURST)
+    # Refresh the TTL on every use so an active user's bucket is never reset mid-batch
+    _user_buckets.set(user_id, bucket)
+    return bucket
+
+
+async def _call(client, user_bucket: TokenBucket, func, *args, **kwargs):
+    """Run one send, retrying FloodWaits; the last FloodWait is raised instead of returning nothing"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await user_bucket.acquire()
+        await client.delivery_bucket.acquire()
+        async with client.delivery_semaphore:
+            try:
+                result = await func(*args, **kwargs)
+                client.delivery_bucket.recover()
+                user_bucket.recover()
+                return result
+            except FloodWait as e:
+                # Shared by every delivery, so one FloodWait slows all of them down,
+                # and this user's own rate is halved in case the limit was their chat's
+                client.delivery_bucket.backoff(e.value)
+                user_bucket.backoff(e.value)
+                if attempt == MAX_ATTEMPTS:
+                    raise
+
+
+async def _send_segment(client, user_id: int, bucket: TokenBucket, segment: dict) -> list:
+    msgs = segment["messages"]
+    if segment["kind"] == "album" and len(msgs) > 1:
+        sent = await _call(
+            client, bucket, client.send_media_group,
+            chat_id=user_id,
+            media=[msg.input_media(caption) for msg, caption in zip(msgs, segment["captions"])],
+            protect_content=client.protect
+        )
+        return sent or []
+
+    sent = []
+    for msg, caption in zip(msgs, segment["captions"]):
+        try:
+            copied_msg = await _call(
+                client, bucket, msg.copy, client,
+                chat_id=user_id,
+                caption=caption,
+                reply_markup=msg.reply_markup if not client.disable_btn else None,
+                protect_content=client.protect
+            )
+        except Exception as e:
+            client.LOGGER(__name__, client.name).warning(f"Failed to send message {msg.id} from {msg.chat_id}: {e}")
+            continue
+        if copied_msg:
+            sent.append(copied_msg)
+    return sent
+
+
+async def deliver_messages(client, user_id: int, messages) -> list:
+    """
+    Send DB channel messages (CachedMessage) to a user in their original order.
+
+    Order is kept by sending segments one after another, and albums go out in
+    one send_media_group call. Everything is sent from the cached file ids,
+    captions and buttons, so nothing reads the DB channel: no get_messages
+    and no forward_messages. Calls from all users share DELIVERY_CONCURRENCY
+    slots and one flood backoff, and each user has their own small rate limit.
+
+    Returns the sent messages, for the auto delete timer. A message that still
+    fails after MAX_ATTEMPTS is logged and left out, so fewer messages than
+    asked for means part of the batch wasn't delivered.
+    """
+    bucket = _user_bucket(user_id)
+    sent = []
+    for segment in plan_segments(client, messages):
+        try:
+            sent.extend(await _send_segment(client, user_id, bucket, segment))
+        except Exception as e:
+            # e.g. one file in the album was rejected, so send them one by one instead
+            client.LOGGER(__name__, client.name).warning(f"Batch send failed, copying individually: {e}")
+            sent.extend(await _send_segment(client, user_id, bucket, dict(segment, kind="copy")))
+    return sent
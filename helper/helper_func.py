@@ -1,5 +1,6 @@
 import base64
 import re
+import zlib
 import asyncio
 from pyrogram import filters, Client
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
@@ -7,6 +8,10 @@ from pyrogram.enums import ChatMemberStatus
 from pyrogram.errors import UserNotParticipant, Forbidden, PeerIdInvalid, ChatAdminRequired, FloodWait
 from datetime import datetime, timedelta
 from pyrogram import errors
+from helper.message_cache import get_channel_messages
+from helper.cache import TTLCache
+from helper.tracing import trace, span, traced
+from config import FSUB_CHECK_CONCURRENCY
 
 #===============================================================#
 
@@ -27,19 +32,76 @@ async def decode(base64_string):
 
 #===============================================================#
 
-async def get_messages(client, message_ids):
+# Binary link payload: version byte, varint channel index, varint first id,
+# zigzag varint (last id - first id), then 2 bytes of CRC32 over the rest.
+# String payloads always start with an ASCII letter, so the version byte can't clash.
+PAYLOAD_VERSION = 3
+
+def _put_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _get_varint(data: bytes, pos: int):
+    value = shift = 0
+    while shift < 64:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+    raise ValueError("varint too long")
+
+
+async def encode_ids(channel_index: int, first_id: int, last_id: int = None) -> str:
+    """Compact payload for one message, or first_id..last_id, of the channel at `channel_index`"""
+    delta = 0 if last_id is None else last_id - first_id
+    data = bytearray([PAYLOAD_VERSION])
+    _put_varint(data, channel_index)
+    _put_varint(data, first_id)
+    _put_varint(data, delta * 2 if delta >= 0 else -delta * 2 - 1)
+    data += (zlib.crc32(data) & 0xFFFF).to_bytes(2, "big")
+    return base64.urlsafe_b64encode(bytes(data)).decode("ascii").strip("=")
+
+
+async def decode_ids(base64_string: str):
+    """
+    (channel_index, first_id, last_id) from an encode_ids payload, or None if
+    `base64_string` isn't one. Raises ValueError when the checksum doesn't match.
+    """
+    base64_string = base64_string.strip("=")
+    data = base64.urlsafe_b64decode(base64_string + "=" * (-len(base64_string) % 4))
+    if len(data) < 6 or data[0] != PAYLOAD_VERSION:
+        return None
+    body, checksum = data[:-2], int.from_bytes(data[-2:], "big")
+    if zlib.crc32(body) & 0xFFFF != checksum:
+        raise ValueError("link checksum mismatch")
+    channel_index, pos = _get_varint(body, 1)
+    first_id, pos = _get_varint(body, pos)
+    delta, pos = _get_varint(body, pos)
+    if pos != len(body):
+        raise ValueError("trailing bytes in link")
+    delta = delta >> 1 if not delta & 1 else -(delta >> 1) - 1
+    return channel_index, first_id, first_id + delta
+
+#===============================================================#
+
+async def get_messages(client, message_ids, source_channel_id=None):
     messages = []
     total_messages = 0
     while total_messages != len(message_ids):
         temb_ids = message_ids[total_messages:total_messages+200]
         try:
             # Use new multi-DB channel function
-            msgs = await get_messages_from_db_channels(client, temb_ids)
+            msgs = await get_messages_from_db_channels(client, temb_ids, source_channel_id)
         except FloodWait as e:
             await asyncio.sleep(e.x)
-            msgs = await get_messages_from_db_channels(client, temb_ids)
+            msgs = await get_messages_from_db_channels(client, temb_ids, source_channel_id)
         except:
-            pass
+            msgs = []
         total_messages += len(temb_ids)
         messages.extend(msgs)
     return messages
@@ -103,64 +165,69 @@ async def get_message_id_legacy(client, message):
 
 #===============================================================#
 
-async def get_messages_from_db_channels(client, temb_ids):
-    """Get messages from multiple DB channels - tries primary first, then falls back to others"""
-    messages = []
-    total_messages = 0
-    
-    # First try primary DB channel
+# Which DB channel each block of message ids was last found in (ids are bucketed by ID_RANGE_SIZE)
+ID_RANGE_SIZE = 1000
+_channel_ranges = TTLCache(maxsize=50000, ttl=24 * 3600)
+
+
+async def _fetch_from_channel(client, channel_id, ids):
     try:
-        primary_db = getattr(client, 'primary_db_channel', client.db)
-        msgs = await client.get_messages(
-            chat_id=primary_db,
-            message_ids=temb_ids
-        )
-        # Filter out None messages (deleted/not found)
-        valid_msgs = [msg for msg in msgs if msg is not None]
-        messages.extend(valid_msgs)
-        found_ids = {msg.id for msg in valid_msgs}
-        missing_ids = [mid for mid in temb_ids if mid not in found_ids]
-        
-        # If we found all messages, return early
-        if not missing_ids:
-            return messages
-        
-        # Try other DB channels for missing messages
-        db_channels = getattr(client, 'db_channels', {})
-        for channel_id_str, channel_data in db_channels.items():
-            if not channel_data.get('is_active', True):  # Skip inactive channels
-                continue
-            if int(channel_id_str) == primary_db:  # Skip primary (already tried)
-                continue
-                
-            try:
-                additional_msgs = await client.get_messages(
-                    chat_id=int(channel_id_str),
-                    message_ids=missing_ids
-                )
-                valid_additional = [msg for msg in additional_msgs if msg is not None]
-                messages.extend(valid_additional)
-                
-                # Update missing IDs
-                found_additional_ids = {msg.id for msg in valid_additional}
-                missing_ids = [mid for mid in missing_ids if mid not in found_additional_ids]
-                
-                # If we found all remaining messages, break
-                if not missing_ids:
-                    break
-                    
-            except Exception as e:
-                client.LOGGER(__name__, client.name).warning(f"Error getting messages from DB channel {channel_id_str}: {e}")
-                continue
-        
+        return await get_channel_messages(client, channel_id, ids)
     except FloodWait as e:
-        await asyncio.sleep(e.x)
-        # Retry with the same function
-        return await get_messages_from_db_channels(client, temb_ids)
+        await asyncio.sleep(e.value)
+        return await get_channel_messages(client, channel_id, ids)
     except Exception as e:
-        client.LOGGER(__name__, client.name).warning(f"Error getting messages from DB channels: {e}")
-    
-    return messages
+        client.LOGGER(__name__, client.name).warning(f"Error getting messages from DB channel {channel_id}: {e}")
+        return []
+
+
+@traced("get_messages_from_db_channels")
+async def get_messages_from_db_channels(client, temb_ids, source_channel_id=None):
+    """
+    Get messages from the DB channels.
+
+    Ids are asked from `source_channel_id` when the link told us where they
+    live, otherwise from the channel their id range was last found in (the
+    primary by default). Whatever is still missing is asked from every other
+    active DB channel at once, and the channel that had it is remembered for
+    its id range.
+    """
+    primary_db = getattr(client, 'primary_db_channel', client.db)
+    found = {}
+    tried = {}
+
+    # Most links resolve here in a single lookup
+    plan = {}
+    for mid in temb_ids:
+        channel_id = source_channel_id or _channel_ranges.get(mid // ID_RANGE_SIZE, primary_db)
+        plan.setdefault(channel_id, []).append(mid)
+        tried[mid] = channel_id
+    results = await asyncio.gather(*(_fetch_from_channel(client, channel_id, ids) for channel_id, ids in plan.items()))
+    for msgs in results:
+        for msg in msgs:
+            found[msg.id] = msg
+
+    missing_ids = [mid for mid in temb_ids if mid not in found]
+    if missing_ids:
+        db_channels = getattr(client, 'db_channels', {})
+        channels = [primary_db] + [
+            int(channel_id_str) for channel_id_str, channel_data in db_channels.items()
+            if channel_data.get('is_active', True) and int(channel_id_str) != primary_db
+        ]
+        lookups = []
+        for channel_id in channels:
+            ids = [mid for mid in missing_ids if tried[mid] != channel_id]
+            if ids:
+                lookups.append((channel_id, ids))
+        results = await asyncio.gather(*(_fetch_from_channel(client, channel_id, ids) for channel_id, ids in lookups))
+        # Earlier channels win when an id exists in more than one
+        for (channel_id, _), msgs in zip(lookups, results):
+            for msg in msgs:
+                if msg.id not in found:
+                    found[msg.id] = msg
+                    _channel_ranges.set(msg.id // ID_RANGE_SIZE, channel_id)
+
+    return [found[mid] for mid in temb_ids if mid in found]
 
 #===============================================================#
 
@@ -205,86 +272,98 @@ async def is_bot_admin(client, channel_id):
 
 #===============================================================#
 
-async def check_subscription(client, user_id):
-    """Enhanced subscription check with better request channel handling."""
-    statuses = {}
+async def check_channel_subscription(client, user_id, channel_id, channel_name, request, semaphore: asyncio.Semaphore):
+    """Resolve one channel's status for a user; the status writes it implies are queued write-behind."""
+    db = client.mongodb
+    # Later writes for the same document replace earlier ones until the queue flushes
+    record = db.status_writes.put
 
-    # Ensure user exists in database
-    if not await client.mongodb.present_user(user_id):
-        await client.mongodb.add_user(user_id)
+    # Trust a fresh cached admission instead of asking Telegram again
+    cached_status = client.fsub_cache.lookup(user_id, channel_id)
+    if cached_status is not None:
+        return cached_status
 
-    for channel_id, (channel_name, channel_link, request, timer) in client.fsub_dict.items():
-        try:
+    try:
+        async with semaphore:
             # Get actual membership status first
             user = await client.get_chat_member(channel_id, user_id)
-            actual_status = user.status
-            
-            # If user is already a member, admin, or owner
-            if actual_status in {ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER}:
-                await client.mongodb.update_fsub_status(user_id, channel_id, "joined")
-                await client.mongodb.add_channel_user(channel_id, user_id)
-                
-                # If there was a pending join request, mark it as approved
-                if request and await client.mongodb.has_submitted_join_request(user_id, channel_id):
-                    await client.mongodb.update_join_request_status(user_id, channel_id, "approved")
-                
-                statuses[channel_id] = actual_status
-                continue
-            
-            # User is not a member - check if they left after being approved  
-            if request:
-                # For request channels, check if user has submitted a request
-                has_request = await client.mongodb.has_submitted_join_request(user_id, channel_id)
-                if has_request:
-                    # User has submitted request but not yet a member
-                    request_status = await client.mongodb.get_join_request_status(user_id, channel_id)
-                    
-                    if request_status == "approved":
-                        # Request was approved but user still not in channel
-                        # This means user might have left after approval - force them to rejoin
-                        await client.mongodb.update_fsub_status(user_id, channel_id, "left")
-                        await client.mongodb.remove_join_request(user_id, channel_id)
-                        statuses[channel_id] = ChatMemberStatus.BANNED
-                    else:
-                        # Request is still pending, allow user to proceed
-                        await client.mongodb.update_fsub_status(user_id, channel_id, "request_submitted")
-                        statuses[channel_id] = ChatMemberStatus.MEMBER  # Treat as subscribed for request channels
-                else:
-                    # No request submitted yet for request channel
-                    await client.mongodb.update_fsub_status(user_id, channel_id, "not_requested")
-                    statuses[channel_id] = ChatMemberStatus.BANNED
-            else:
-                # Regular channel (not request), user must be a member
-                await client.mongodb.update_fsub_status(user_id, channel_id, "left")
-                await client.mongodb.remove_channel_user(channel_id, user_id)
-                statuses[channel_id] = ChatMemberStatus.BANNED
-                
-        except UserNotParticipant:
-            # User is not in the channel
-            await client.mongodb.update_fsub_status(user_id, channel_id, "left")
-            await client.mongodb.remove_channel_user(channel_id, user_id)
-            
-            if request:
-                # For request channels, check if user has submitted a request
-                has_request = await client.mongodb.has_submitted_join_request(user_id, channel_id)
-                if has_request:
-                    # User has submitted request but not in channel - still allow access for request channels
-                    await client.mongodb.update_fsub_status(user_id, channel_id, "request_submitted")
-                    statuses[channel_id] = ChatMemberStatus.MEMBER  # Treat as subscribed for request channels
-                else:
-                    # No request submitted yet
-                    await client.mongodb.update_fsub_status(user_id, channel_id, "not_requested")
-                    statuses[channel_id] = ChatMemberStatus.BANNED
-            else:
-                # Regular channel, user must join
-                statuses[channel_id] = ChatMemberStatus.BANNED
-                
-        except Forbidden:
-            client.LOGGER(__name__, client.name).warning(f"Bot lacks permission for {channel_name}.")
-            statuses[channel_id] = None
-        except Exception as e:
-            client.LOGGER(__name__, client.name).warning(f"Error checking {channel_name}: {e}")
-            statuses[channel_id] = None
+        actual_status = user.status
+        # One read covers both "has a request" and "what state is it in"
+        request_status = await db.get_join_request_status(user_id, channel_id) if request else None
+
+        # If user is already a member, admin, or owner
+        if actual_status in {ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER}:
+            record(*db.fsub_status_op(user_id, channel_id, "joined"))
+            record(*db.channel_user_op(channel_id, user_id, True))
+
+            # If there was a pending join request, mark it as approved
+            if request_status is not None:
+                record(*db.join_request_status_op(user_id, channel_id, "approved"))
+
+            return actual_status
+
+        # User is not a member - check if they left after being approved
+        if request:
+            if request_status is None:
+                # No request submitted yet for request channel
+                record(*db.fsub_status_op(user_id, channel_id, "not_requested"))
+                return ChatMemberStatus.BANNED
+            if request_status == "approved":
+                # Request was approved but user still not in channel
+                # This means user might have left after approval - force them to rejoin
+                record(*db.fsub_status_op(user_id, channel_id, "left"))
+                record(*db.remove_join_request_op(user_id, channel_id))
+                return ChatMemberStatus.BANNED
+            # Request is still pending, allow user to proceed
+            record(*db.fsub_status_op(user_id, channel_id, "request_submitted"))
+            return ChatMemberStatus.MEMBER  # Treat as subscribed for request channels
+
+        # Regular channel (not request), user must be a member
+        record(*db.fsub_status_op(user_id, channel_id, "left"))
+        record(*db.channel_user_op(channel_id, user_id, False))
+        return ChatMemberStatus.BANNED
+
+    except UserNotParticipant:
+        # User is not in the channel
+        record(*db.channel_user_op(channel_id, user_id, False))
+
+        if request and await db.has_submitted_join_request(user_id, channel_id):
+            # User has submitted request but not in channel - still allow access for request channels
+            record(*db.fsub_status_op(user_id, channel_id, "request_submitted"))
+            return ChatMemberStatus.MEMBER  # Treat as subscribed for request channels
+        if request:
+            # No request submitted yet
+            record(*db.fsub_status_op(user_id, channel_id, "not_requested"))
+            return ChatMemberStatus.BANNED
+        # Regular channel, user must join
+        record(*db.fsub_status_op(user_id, channel_id, "left"))
+        return ChatMemberStatus.BANNED
+
+    except Forbidden:
+        client.LOGGER(__name__, client.name).warning(f"Bot lacks permission for {channel_name}.")
+        return None
+    except Exception as e:
+        client.LOGGER(__name__, client.name).warning(f"Error checking {channel_name}: {e}")
+        return None
+
+#===============================================================#
+
+@traced("check_subscription")
+async def check_subscription(client, user_id):
+    """Enhanced subscription check - all channels are checked concurrently, status writes are flushed in the background."""
+    channels = list(client.fsub_dict.items())
+    # Per check, so one user's /start never waits behind another's
+    semaphore = asyncio.Semaphore(FSUB_CHECK_CONCURRENCY)
+    results = await asyncio.gather(*(
+        check_channel_subscription(client, user_id, channel_id, channel_name, request, semaphore)
+        for channel_id, (channel_name, channel_link, request, timer) in channels
+    ))
+
+    statuses = {}
+    for (channel_id, _), status in zip(channels, results):
+        statuses[channel_id] = status
+        if status is not None:
+            client.fsub_cache.mark(user_id, channel_id, status)
 
     return statuses
 
@@ -299,11 +378,26 @@ def is_user_subscribed(statuses):
 
 #===============================================================#
 
+async def get_user_context(client, message) -> dict:
+    """User, ban, premium and access token state of the sender, loaded once per update and kept on the message"""
+    context = getattr(message, 'user_context', None)
+    if context is None:
+        context = await client.mongodb.get_user_context(message.from_user.id)
+        message.user_context = context
+    return context
+
+#===============================================================#
+
 def force_sub(func):
     """Decorator to enforce force subscription before executing a command."""
-    async def wrapper(client: Client, message: Message):
+    async def passes(client: Client, message: Message) -> bool:
+        # Also registers the user, so the command behind this reads it from memory
+        await get_user_context(client, message)
         if not client.fsub_dict:
-            return await func(client, message)
+            return True
+        # Repeat visitors with a fresh cached membership skip every live check
+        if client.fsub_cache.is_subscribed(message.from_user.id, client.fsub_dict.keys()):
+            return True
         photo = client.messages.get('FSUB_PHOTO', '')
         if photo:
             msg = await message.reply_photo(
@@ -319,7 +413,7 @@ def force_sub(func):
 
         if is_user_subscribed(statuses):
             await msg.delete()
-            return await func(client, message)
+            return True
 
         # User is not subscribed to all channels
         buttons = []
@@ -384,6 +478,15 @@ def force_sub(func):
                 await message.reply(text=channels_message, reply_markup=buttons_markup)
             except Exception:
                 pass
+        return False
+
+    async def wrapper(client: Client, message: Message):
+        # Root of the (sampled) trace for the whole command
+        async with trace(func.__name__, user_id=message.from_user.id):
+            async with span("force_sub"):
+                allowed = await passes(client, message)
+            if allowed:
+                return await func(client, message)
 
     return wrapper
 
@@ -423,42 +526,17 @@ DEL_MSG = """<b>This File is deleting automatically in <a href="https://t.me/{us
 #Function for provide auto delete notification message
 async def auto_del_notification(bot_username, msg, delay_time, transfer): 
     temp = await msg.reply_text(DEL_MSG.format(username=bot_username, time=convert_time(delay_time)), disable_web_page_preview = True) 
-
-    await asyncio.sleep(delay_time)
-    try:
-        if transfer:
-            try:
-                name = "• ɢᴇᴛ ғɪʟᴇs •"
-                link = f"https://t.me/{bot_username}?start={transfer}"
-                button = [[InlineKeyboardButton(text=name, url=link), InlineKeyboardButton(text="ᴄʟᴏsᴇ •", callback_data = "close")]]
-
-                await temp.edit_text(text=f"<b>›› Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ\n\nIғ ʏᴏᴜ ᴡᴀɴᴛ ᴛᴏ ɢᴇᴛ ᴛʜᴇ ғɪʟᴇs ᴀɢᴀɪɴ, ᴛʜᴇɴ ᴄʟɪᴄᴋ: <a href={link}>{name}</a> ʙᴜᴛᴛᴏɴ ʙᴇʟᴏᴡ ᴇʟsᴇ ᴄʟᴏsᴇ ᴛʜɪs ᴍᴇssᴀɢᴇ.</b>", reply_markup=InlineKeyboardMarkup(button), disable_web_page_preview = True)
-
-            except Exception as e:
-                await temp.edit_text(f"<b>›› Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ </b>")
-                print(f"Error occured while editing the Delete message: {e}")
-        else:
-            await temp.edit_text(f"<b>Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ </b>")
-
-    except Exception as e:
-        print(f"Error occured while editing the Delete message: {e}")
-        await temp.edit_text(f"<b>Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ </b>")
-
-    try: await msg.delete()
-    except Exception as e: print(f"Error occurred on auto_del_notification() : {e}")
+    await msg._client.auto_delete.schedule(msg.chat.id, [msg.id], delay_time, notice_id=temp.id, transfer_link=transfer)
 
 #Function for deleteing files/Messages.....
 async def delete_message(msg, delay_time): 
-    await asyncio.sleep(delay_time)
-    
-    try: await msg.delete()
-    except Exception as e: print(f"Error occurred on delete_message() : {e}")
+    await msg._client.auto_delete.schedule(msg.chat.id, [msg.id], delay_time)
 
 #===============================================================#
 
 #Function for batch auto delete - sends one notification for all files
 async def batch_auto_del_notification(bot_username, messages, delay_time, transfer_link, chat_id, client):
-    """Send one notification for batch of files and delete all after timer"""
+    """Send one notification for batch of files and schedule all of them for deletion"""
     if not messages:
         return
         
@@ -469,32 +547,10 @@ async def batch_auto_del_notification(bot_username, messages, delay_time, transf
         disable_web_page_preview=True
     )
     
-    await asyncio.sleep(delay_time)
-    
-    # Delete all file messages
-    for msg in messages:
-        try:
-            await msg.delete()
-        except Exception as e:
-            print(f"Error deleting message {getattr(msg, 'id', 'Unknown')}: {e}")
-    
-    # Update notification with get files button
-    try:
-        if transfer_link:
-            try:
-                name = "• ɢᴇᴛ ғɪʟᴇs •"
-                link = f"https://t.me/{bot_username}?start={transfer_link}"
-                button = [[InlineKeyboardButton(text=name, url=link), InlineKeyboardButton(text="ᴄʟᴏsᴇ •", callback_data="close")]]
-                
-                await notification_msg.edit_text(
-                    text=f"<b>›› Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ\n\nIғ ʏᴏᴜ ᴡᴀɴᴛ ᴛᴏ ɢᴇᴛ ᴛʜᴇ ғɪʟᴇs ᴀɢᴀɪɴ, ᴛʜᴇɴ ᴄʟɪᴄᴋ: <a href={link}>{name}</a> ʙᴜᴛᴛᴏɴ ʙᴇʟᴏᴡ ᴇʟsᴇ ᴄʟᴏsᴇ ᴛʜɪs ᴍᴇssᴀɢᴇ.</b>",
-                    reply_markup=InlineKeyboardMarkup(button),
-                    disable_web_page_preview=True
-                )
-            except Exception as e:
-                await notification_msg.edit_text(f"<b>›› Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ</b>")
-                print(f"Error editing notification message: {e}")
-        else:
-            await notification_msg.edit_text(f"<b>Pʀᴇᴠɪᴏᴜs Mᴇssᴀɢᴇ ᴡᴀs Dᴇʟᴇᴛᴇᴅ</b>")
-    except Exception as e:
-        print(f"Error updating notification message: {e}")
+    # Messages or plain message ids; the scheduler keeps only the ids
+    message_ids = [msg if isinstance(msg, int) else msg.id for msg in messages]
+    await client.auto_delete.schedule(
+        chat_id, message_ids, delay_time,
+        notice_id=notification_msg.id,
+        transfer_link=transfer_link
+    )
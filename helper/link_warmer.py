@@ -0,0 +1,73 @@
+#(©) Codeflix_Bots - Shortlink warm-up queue
+
+import asyncio
+from helper.rate_limit import TokenBucket
+from config import SHORT_URL, SHORT_API, LINK_WARMUP_RATE, LINK_WARMUP_QUEUE_SIZE
+
+#===============================================================#
+
+def verification_url(client, payload: str) -> str:
+    """The `yu3elk…7` link /start sends through the shortener for `payload`"""
+    return f"https://t.me/{client.username}?start=yu3elk{payload}7"
+
+#===============================================================#
+
+class LinkWarmer:
+    """
+    Shortens the verification link of every newly generated file link in the
+    background, so the first /start for that file is served from the short link cache.
+
+    Work is spread out by a token bucket of LINK_WARMUP_RATE calls per second,
+    so a burst of uploads can't exhaust the shortener API. If the queue is full,
+    payloads are dropped; /start then shortens them on demand as before.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.bucket = TokenBucket(LINK_WARMUP_RATE)
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=LINK_WARMUP_QUEUE_SIZE)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def submit(self, payload: str):
+        """Queue the verification link for a `?start=` payload"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass
+
+    async def _shortening_needed(self) -> bool:
+        if getattr(self.client, 'shortner_enabled', True):
+            return True
+        # Access Token verification shortens links even when the shortner is switched off
+        return self.client.settings.access_token_settings().get('enabled', False)
+
+    async def _run(self):
+        while True:
+            payload = await self._queue.get()
+            try:
+                if not await self._shortening_needed():
+                    continue
+                await self.bucket.acquire()
+                await self.client.shortener.shorten(
+                    verification_url(self.client, payload),
+                    getattr(self.client, 'short_url', SHORT_URL),
+                    getattr(self.client, 'short_api', SHORT_API),
+                )
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"Link warm-up failed: {e}")
@@ -0,0 +1,125 @@
+#(©) Codeflix_Bots - File link payloads
+
+import asyncio
+from helper.helper_func import decode, encode_ids, decode_ids
+
+#===============================================================#
+
+LINK_VERSION = "v2"  # "v2-{index}-{first}[-{last}]" links, still accepted; new links are binary
+SAVE_ATTEMPTS = 3  # tries to store a new channel index before the link fails
+
+class LinkChannels:
+    """
+    Small, stable indexes for DB channels, so a link can name its channel directly.
+
+    A channel gets the next free index the first time a link is made for it.
+    The index is only used once it is stored in Mongo, so a restart can't hand
+    it to another channel. Indexes are never reused, so links stay valid after
+    channels are added, removed or the primary changes.
+
+    Legacy `get-{id*abs(channel)}` links carry no index. They are resolved against
+    a divisor table (primary first) built once per set of DB channels instead
+    of on every /start.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._by_index = {}
+        self._by_id = {}
+        self._legacy_key = None
+        self._legacy = []
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        try:
+            stored = await self.client.mongodb.get_link_channels()
+        except Exception as e:
+            stored = {}
+            self.client.LOGGER(__name__, self.client.name).warning(f"Error loading link channel indexes: {e}")
+        for channel_id_str, index in stored.items():
+            self._by_index[index] = int(channel_id_str)
+            self._by_id[int(channel_id_str)] = index
+
+    async def index_of(self, channel_id: int) -> int:
+        index = self._by_id.get(channel_id)
+        if index is not None:
+            return index
+        async with self._lock:
+            index = self._by_id.get(channel_id)
+            if index is not None:
+                return index
+            index = max(self._by_index, default=0) + 1
+            for attempt in range(SAVE_ATTEMPTS):
+                try:
+                    await self.client.mongodb.set_link_channel(channel_id, index)
+                    break
+                except Exception as e:
+                    self.client.LOGGER(__name__, self.client.name).warning(f"Error saving link index {index} for {channel_id}: {e}")
+                    if attempt == SAVE_ATTEMPTS - 1:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+            self._by_index[index] = channel_id
+            self._by_id[channel_id] = index
+            return index
+
+    def channel_of(self, index: int):
+        return self._by_index.get(index)
+
+    def legacy_divisors(self) -> list:
+        """(abs(channel_id), channel_id) for every DB channel, primary first"""
+        primary_db = getattr(self.client, 'primary_db_channel', self.client.db)
+        key = (primary_db, tuple(getattr(self.client, 'db_channels', {})))
+        if key != self._legacy_key:
+            channels = [primary_db] + [int(c) for c in key[1] if int(c) != primary_db]
+            self._legacy = [(abs(channel_id), channel_id) for channel_id in channels]
+            self._legacy_key = key
+        return self._legacy
+
+#===============================================================#
+
+async def encode_link(client, channel_id: int, first_id: int, last_id: int = None) -> str:
+    """`?start=` payload for one message, or for first_id..last_id of a DB channel"""
+    index = await client.link_channels.index_of(channel_id)
+    return await encode_ids(index, first_id, last_id)
+
+
+def _id_range(start: int, end: int):
+    return range(start, end + 1) if start <= end else list(range(start, end - 1, -1))
+
+
+def _resolve_legacy(client, numbers: list):
+    for divisor, channel_id in client.link_channels.legacy_divisors():
+        if all(n % divisor == 0 for n in numbers):
+            return channel_id, [n // divisor for n in numbers]
+    # Not from any current DB channel, read it as the primary like before
+    divisor, channel_id = client.link_channels.legacy_divisors()[0]
+    return channel_id, [int(n / divisor) for n in numbers]
+
+
+async def decode_link(client, base64_string: str):
+    """
+    (channel_id, message ids) for a `?start=` payload.
+    Raises ValueError for anything that isn't a valid file link.
+    """
+    packed = await decode_ids(base64_string)
+    if packed is not None:
+        index, first_id, last_id = packed
+        channel_id = client.link_channels.channel_of(index)
+        if channel_id is None:
+            raise ValueError(f"unknown channel index {index}")
+        return channel_id, [first_id] if first_id == last_id else _id_range(first_id, last_id)
+
+    argument = (await decode(base64_string)).split("-")
+    if argument[0] == LINK_VERSION and len(argument) in (3, 4):
+        channel_id = client.link_channels.channel_of(int(argument[1]))
+        if channel_id is None:
+            raise ValueError(f"unknown channel index {argument[1]}")
+        numbers = [int(n) for n in argument[2:]]
+    elif argument[0] == "get" and len(argument) in (2, 3):
+        channel_id, numbers = _resolve_legacy(client, [int(n) for n in argument[1:]])
+    else:
+        raise ValueError("not a file link")
+
+    if len(numbers) == 2:
+        return channel_id, _id_range(numbers[0], numbers[1])
+    return channel_id, [numbers[0]]
@@ -0,0 +1,86 @@
+#(©) Codeflix_Bots - Local HTTP streaming of Telegram media
+
+import secrets
+import time
+from helper.screenshot_helper import extract_screenshots
+from config import PORT, STREAM_HOST, STREAM_TOKEN_TTL
+
+#===============================================================#
+
+CHUNK_SIZE = 1024 * 1024  # stream_media always yields 1 MiB chunks
+
+class MediaStreamRegistry:
+    """
+    Short-lived tokens that expose a single Telegram file at /stream/{token}.
+
+    FFmpeg reads the file from the bot's own web server with HTTP Range
+    requests. Each Range maps to a stream_media call that starts at the
+    matching chunk, so only the parts FFmpeg seeks to are downloaded.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, client, message, file_size: int, mime_type: str = None) -> str:
+        self._purge()
+        token = secrets.token_urlsafe(24)
+        self._entries[token] = {
+            "client": client,
+            "message": message,
+            "file_size": file_size,
+            "mime_type": mime_type or "application/octet-stream",
+            "expires_at": time.monotonic() + STREAM_TOKEN_TTL,
+        }
+        return token
+
+    def unregister(self, token: str):
+        self._entries.pop(token, None)
+
+    def get(self, token: str):
+        entry = self._entries.get(token)
+        if entry and entry["expires_at"] < time.monotonic():
+            self.unregister(token)
+            return None
+        return entry
+
+    def _purge(self):
+        now = time.monotonic()
+        for token in [t for t, e in self._entries.items() if e["expires_at"] < now]:
+            del self._entries[token]
+
+
+media_streams = MediaStreamRegistry()
+
+#===============================================================#
+
+async def iter_range(client, message, start: int, end: int):
+    """Yield bytes start..end (inclusive) of the message's media"""
+    skip = start % CHUNK_SIZE
+    remaining = end - start + 1
+    async for chunk in client.stream_media(message, offset=start // CHUNK_SIZE):
+        if skip:
+            chunk = chunk[skip:]
+            skip = 0
+        chunk = chunk[:remaining]
+        remaining -= len(chunk)
+        yield chunk
+        if remaining <= 0:
+            break
+
+
+async def extract_streaming_screenshots(client, message, num_screenshots: int = 4) -> list:
+    """
+    Extract screenshots while reading only the needed byte ranges of the video.
+    Returns [] when FFmpeg can't seek the container over HTTP, and fewer than
+    num_screenshots paths when some frames failed; callers fall back to a
+    download whenever they got fewer than they asked for.
+    """
+    media = message.video or message.document
+    if not media or not media.file_size:
+        return []
+    token = media_streams.register(client, message, media.file_size, media.mime_type)
+    try:
+        url = f"http://{STREAM_HOST}:{PORT}/stream/{token}"
+        return await extract_screenshots(url, num_screenshots, duration=getattr(media, "duration", None))
+    finally:
+        media_streams.unregister(token)
@@ -0,0 +1,200 @@
+#(©) Codeflix_Bots - DB channel message cache
+
+from datetime import datetime
+from pyrogram.types import InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio, InlineKeyboardMarkup, InlineKeyboardButton
+from helper.cache import TTLCache
+from config import MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL
+
+#===============================================================#
+
+MEDIA_TYPES = ("document", "video", "photo", "audio", "animation", "voice", "video_note", "sticker")
+ALBUM_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+
+class CachedMessage:
+    """
+    The parts of a DB channel message needed to send it again: file_id,
+    caption html, buttons and album id. Messages that can't be rebuilt from
+    these (polls, contacts, ...) keep the original Message and are copied
+    the usual way. Those are never put in the cache.
+    """
+
+    __slots__ = ("id", "chat_id", "media_type", "file_id", "file_unique_id", "file_size", "file_name",
+                 "caption_html", "text_html", "reply_markup", "media_group_id", "message")
+
+    def __init__(self, id, chat_id, media_type=None, file_id=None, file_unique_id=None, file_size=None, file_name=None,
+                 caption_html="", text_html=None, reply_markup=None, media_group_id=None, message=None):
+        self.id = id
+        self.chat_id = chat_id
+        self.media_type = media_type
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.file_size = file_size
+        self.file_name = file_name
+        self.caption_html = caption_html
+        self.text_html = text_html
+        self.reply_markup = reply_markup
+        self.media_group_id = media_group_id
+        self.message = message
+
+    @classmethod
+    def from_message(cls, msg):
+        media_type = next((t for t in MEDIA_TYPES if getattr(msg, t, None)), None)
+        media = getattr(msg, media_type) if media_type else None
+        cached = cls(
+            id=msg.id,
+            chat_id=msg.chat.id,
+            media_type=media_type,
+            file_id=media.file_id if media else None,
+            file_unique_id=media.file_unique_id if media else None,
+            file_size=getattr(media, "file_size", None),
+            file_name=getattr(media, "file_name", None),
+            caption_html=msg.caption.html if msg.caption else "",
+            text_html=msg.text.html if msg.text else None,
+            reply_markup=msg.reply_markup,
+            media_group_id=msg.media_group_id,
+        )
+        if media is None and msg.text is None:
+            cached.message = msg
+        return cached
+
+    @classmethod
+    def from_document(cls, doc: dict):
+        """Rebuild from a `files` index document"""
+        buttons = doc.get("buttons")
+        return cls(
+            id=doc["message_id"],
+            chat_id=doc["channel_id"],
+            media_type=doc.get("type"),
+            file_id=doc.get("file_id"),
+            file_unique_id=doc.get("file_unique_id"),
+            file_size=doc.get("size"),
+            file_name=doc.get("file_name"),
+            caption_html=doc.get("caption") or "",
+            text_html=doc.get("text"),
+            reply_markup=InlineKeyboardMarkup(
+                [[InlineKeyboardButton(b["text"], url=b["url"]) for b in row] for row in buttons]
+            ) if buttons else None,
+            media_group_id=doc.get("media_group_id"),
+        )
+
+    def to_document(self) -> dict:
+        """Document for the `files` index; only URL buttons are kept"""
+        buttons = None
+        if isinstance(self.reply_markup, InlineKeyboardMarkup):
+            buttons = [[{"text": b.text, "url": b.url} for b in row if b.url] for row in self.reply_markup.inline_keyboard]
+            buttons = [row for row in buttons if row] or None
+        return {
+            "_id": f"{self.chat_id}:{self.id}",
+            "channel_id": self.chat_id,
+            "message_id": self.id,
+            "type": self.media_type,
+            "file_id": self.file_id,
+            "file_unique_id": self.file_unique_id,
+            "size": self.file_size,
+            "file_name": self.file_name,
+            "caption": self.caption_html,
+            "text": self.text_html,
+            "buttons": buttons,
+            "media_group_id": self.media_group_id,
+            "indexed_at": datetime.now(),
+        }
+
+    @property
+    def cacheable(self) -> bool:
+        return self.message is None
+
+    @property
+    def is_document(self) -> bool:
+        return self.media_type == "document"
+
+    def input_media(self, caption: str):
+        """InputMedia for send_media_group, or None if this can't be part of an album"""
+        media_cls = ALBUM_MEDIA.get(self.media_type)
+        return media_cls(self.file_id, caption=caption) if media_cls and self.cacheable else None
+
+    async def copy(self, client, chat_id, caption: str = None, reply_markup=None, protect_content: bool = None):
+        if self.message is not None:
+            return await self.message.copy(chat_id=chat_id, caption=caption, reply_markup=reply_markup, protect_content=protect_content)
+        if self.media_type is None:
+            return await client.send_message(chat_id, self.text_html, reply_markup=reply_markup, protect_content=protect_content)
+        return await client.send_cached_media(chat_id, self.file_id, caption=caption or "", reply_markup=reply_markup, protect_content=protect_content)
+
+#===============================================================#
+
+message_cache = TTLCache(MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL)
+
+
+def invalidate(channel_id: int, message_ids):
+    for message_id in message_ids:
+        message_cache.pop((channel_id, message_id))
+
+
+async def index_messages(client, messages):
+    """Add DB channel messages to the `files` index (and refresh their cache entries)"""
+    docs = []
+    for msg in messages:
+        if msg is None or msg.empty:
+            continue
+        cached = CachedMessage.from_message(msg)
+        if cached.cacheable:
+            message_cache.set((cached.chat_id, cached.id), cached)
+            docs.append(cached.to_document())
+    if docs:
+        try:
+            await client.mongodb.save_files(docs)
+        except Exception as e:
+            print(f"Error indexing files: {e}")
+    return len(docs)
+
+
+async def get_channel_messages(client, channel_id: int, message_ids) -> list:
+    """
+    Messages from one DB channel as CachedMessage, in the order asked for.
+
+    Looked up in memory first, then in the `files` index, and only the rest
+    is fetched from Telegram (and indexed). Ids that don't exist are left out.
+    """
+    found = {}
+    missing = []
+    for message_id in message_ids:
+        cached = message_cache.get((channel_id, message_id))
+        if cached is not None:
+            found[message_id] = cached
+        else:
+            missing.append(message_id)
+
+    if missing:
+        try:
+            docs = await client.mongodb.get_files(channel_id, missing)
+        except Exception as e:
+            print(f"Error reading file index: {e}")
+            docs = []
+        for doc in docs:
+            cached = CachedMessage.from_document(doc)
+            message_cache.set((channel_id, cached.id), cached)
+            found[cached.id] = cached
+        missing = [message_id for message_id in missing if message_id not in found]
+
+    fetched = []
+    for i in range(0, len(missing), 200):
+        msgs = await client.get_messages(chat_id=channel_id, message_ids=missing[i:i + 200])
+        for msg in msgs if isinstance(msgs, list) else [msgs]:
+            if msg is None or msg.empty:
+                continue
+            cached = CachedMessage.from_message(msg)
+            if cached.cacheable:
+                message_cache.set((channel_id, msg.id), cached)
+                fetched.append(cached.to_document())
+            found[msg.id] = cached
+    if fetched:
+        try:
+            await client.mongodb.save_files(fetched)
+        except Exception as e:
+            print(f"Error indexing files: {e}")
+
+    return [found[message_id] for message_id in message_ids if message_id in found]
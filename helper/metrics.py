@@ -0,0 +1,158 @@
+#(©) Codeflix_Bots - In-process metrics registry
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+
+#===============================================================#
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """Buckets are counted per slot on observe() and only made cumulative when scraped"""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (slots, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), slots):
+                cumulative += count
+                le = _labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Collected:
+    """Metric read from existing state when scraped, so the hot path isn't touched at all"""
+
+    def __init__(self, name: str, help: str, kind: str, func, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.func = func
+        self.labels = labels
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.func()
+        if isinstance(value, dict):
+            for label_values, v in value.items():
+                label_values = label_values if isinstance(label_values, tuple) else (label_values,)
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {v}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        # Re-registering (e.g. a second Bot in the same process) replaces the old one
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collect(self, name: str, help: str, kind: str, func, labels: tuple = ()) -> Collected:
+        return self._add(Collected(name, help, kind, func, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+#===============================================================#
+
+handler_seconds = registry.histogram("bot_handler_seconds", "Time spent in each update handler", ("handler",))
+mongo_seconds = registry.histogram("bot_mongo_op_seconds", "Latency of MongoDB methods", ("method",))
+telegram_calls = registry.counter("bot_telegram_calls_total", "Telegram API calls by method", ("method",))
+telegram_flood_waits = registry.counter("bot_telegram_flood_waits_total", "FloodWait errors by method", ("method",))
+shortener_lookups = registry.counter("bot_shortener_lookups_total", "Shortened link lookups by where they were answered", ("source",))
+ffmpeg_seconds = registry.histogram("bot_ffmpeg_job_seconds", "Duration of FFmpeg screenshot jobs", ("result",))
+
+#===============================================================#
+
+def observe_methods(cls, histogram: Histogram):
+    """Time every public coroutine method of `cls` into `histogram`, labelled by method name"""
+    for attr, func in list(vars(cls).items()):
+        if not attr.startswith("_") and inspect.iscoroutinefunction(func):
+            setattr(cls, attr, _observed(func, histogram, attr))
+    return cls
+
+
+def _observed(func, histogram: Histogram, label: str):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started, label)
+    return wrapper
+
+
+def instrument_handlers(client):
+    """Time every coroutine handler registered on the client's dispatcher"""
+    for handlers in client.dispatcher.groups.values():
+        for handler in handlers:
+            callback = handler.callback
+            if inspect.iscoroutinefunction(callback) and not getattr(callback, "_observed", False):
+                handler.callback = _observed(callback, handler_seconds, callback.__name__)
+                handler.callback._observed = True
@@ -0,0 +1,61 @@
+#(©) Codeflix_Bots - Rate limiting
+
+import asyncio
+import time
+
+#===============================================================#
+
+class TokenBucket:
+    """
+    Async token bucket with adaptive backoff.
+
+    `rate` tokens are added per second up to `capacity`. On a FloodWait call
+    backoff(seconds): every caller is paused for that long and the rate is
+    halved. recover() then adds the rate back a little at a time, up to the
+    configured maximum.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, min_rate: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.min_rate = min_rate or max(rate / 10, 0.1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = None
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters queue on the lock, so tokens are handed out first come first served
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def backoff(self, seconds: float):
+        """Pause all callers for `seconds` and halve the rate."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = 0
+
+    def recover(self, step: float = None):
+        """Additively raise the rate back towards max_rate after a success."""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + (step or self.max_rate / 100))
+
+    @property
+    def backoff_remaining(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
@@ -3,15 +3,23 @@
 import asyncio
 import os
 import shutil
+import subprocess
 import tempfile
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 import logging
+from config import FFMPEG_WORKERS, SCREENSHOT_TIMEOUT
+from helper.metrics import ffmpeg_seconds
 
 logger = logging.getLogger(__name__)
 
 # Global variable to store found FFmpeg path
 FFMPEG_PATH = None
 FFPROBE_PATH = None
+FFMPEG_AVAILABLE = False
+
+# Limits how many FFmpeg jobs run at the same time
+_ffmpeg_slots = asyncio.Semaphore(FFMPEG_WORKERS)
 
 
 def get_ffmpeg_path() -> str:
@@ -108,6 +116,42 @@ def get_ffprobe_path() -> str:
     return 'ffprobe'  # Default fallback
 
 
+async def run_process(cmd: List[str], timeout: float) -> Tuple[int, bytes, bytes]:
+    """
+    Run a command without blocking the event loop.
+    
+    The process is killed if it runs longer than `timeout` seconds (raises
+    asyncio.TimeoutError) or if the awaiting task is cancelled.
+    
+    Returns:
+        Tuple of (return code, stdout, stderr)
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except NotImplementedError:
+        # The Windows selector event loop has no subprocess support, use a thread instead
+        try:
+            result = await asyncio.to_thread(
+                subprocess.run, cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise asyncio.TimeoutError()
+        return result.returncode, result.stdout, result.stderr
+    
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    return process.returncode, stdout, stderr
+
+
 async def check_ffmpeg_installed() -> bool:
     """
     Check if FFmpeg is installed and available.
@@ -115,7 +159,9 @@ async def check_ffmpeg_installed() -> bool:
     Returns:
         True if FFmpeg is available, False otherwise
     """
-    import subprocess
+    global FFMPEG_AVAILABLE
+    if FFMPEG_AVAILABLE:
+        return True
     
     ffmpeg_path = get_ffmpeg_path()
     logger.info(f"Checking FFmpeg at: {ffmpeg_path}")
@@ -126,21 +172,16 @@ async def check_ffmpeg_installed() -> bool:
         return False
     
     try:
-        # Use subprocess.run instead of asyncio for more reliable Windows support
-        result = subprocess.run(
-            [ffmpeg_path, '-version'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=10
-        )
-        if result.returncode == 0:
+        returncode, _, _ = await run_process([ffmpeg_path, '-version'], timeout=10)
+        if returncode == 0:
             logger.info(f"FFmpeg found and working at: {ffmpeg_path}")
+            FFMPEG_AVAILABLE = True
             return True
         else:
-            logger.warning(f"FFmpeg returned error code: {result.returncode}")
+            logger.warning(f"FFmpeg returned error code: {returncode}")
     except FileNotFoundError:
         logger.warning(f"FFmpeg not found at: {ffmpeg_path}")
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.warning(f"FFmpeg check timed out at: {ffmpeg_path}")
     except Exception as e:
         logger.warning(f"FFmpeg check error: {type(e).__name__}: {e}")
@@ -158,15 +199,13 @@ async def get_video_duration(video_path: str) -> Optional[float]:
     Returns:
         Duration in seconds or None if failed
     """
-    import subprocess
-    
     try:
         ffprobe_cmd = get_ffprobe_path()
         logger.info(f"Using FFprobe at: {ffprobe_cmd}")
         logger.info(f"Video path: {video_path}")
         
-        # Check if video file exists
-        if not os.path.exists(video_path):
+        # Check if video file exists (URLs are probed directly)
+        if not video_path.startswith(("http://", "https://")) and not os.path.exists(video_path):
             logger.error(f"Video file does not exist: {video_path}")
             return None
         
@@ -178,16 +217,10 @@ async def get_video_duration(video_path: str) -> Optional[float]:
             video_path
         ]
         
-        # Use subprocess.run for better Windows compatibility
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=30
-        )
+        returncode, stdout, stderr = await run_process(cmd, timeout=30)
         
-        if result.returncode == 0:
-            output = result.stdout.decode().strip()
+        if returncode == 0:
+            output = stdout.decode().strip()
             if output:
                 duration = float(output)
                 logger.info(f"Video duration: {duration}s")
@@ -196,9 +229,9 @@ async def get_video_duration(video_path: str) -> Optional[float]:
                 logger.error("FFprobe returned empty output")
                 return None
         else:
-            logger.error(f"FFprobe error (return code {result.returncode}): {result.stderr.decode()}")
+            logger.error(f"FFprobe error (return code {returncode}): {stderr.decode()}")
             return None
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         logger.error("FFprobe timed out")
         return None
     except ValueError as e:
@@ -212,15 +245,21 @@ async def get_video_duration(video_path: str) -> Optional[float]:
 async def extract_screenshots(
     video_path: str, 
     num_screenshots: int = 4,
-    output_dir: Optional[str] = None
+    output_dir: Optional[str] = None,
+    duration: Optional[float] = None
 ) -> List[str]:
     """
     Extract screenshots from a video at equidistant timestamps.
     
+    All frames come from a single FFmpeg process: every timestamp is a separate
+    fast-seeking input mapped to its own output, so only the region around
+    each frame is decoded. At most FFMPEG_WORKERS extractions run at once.
+    
     Args:
-        video_path: Path to the video file
+        video_path: Path or URL of the video file
         num_screenshots: Number of screenshots to extract (default: 4)
         output_dir: Directory to save screenshots (uses temp dir if None)
+        duration: Known duration in seconds, skips the FFprobe call
         
     Returns:
         List of paths to extracted screenshot images
@@ -228,71 +267,69 @@ async def extract_screenshots(
     screenshot_paths = []
     
     try:
-        # Get video duration
-        duration = await get_video_duration(video_path)
-        if duration is None or duration <= 0:
-            logger.error("Could not determine video duration")
-            return []
-        
-        # Create output directory if not provided
-        if output_dir is None:
-            output_dir = tempfile.mkdtemp(prefix="screenshots_")
-        
-        # Calculate timestamps for equidistant screenshots
-        # Skip first and last 5% to avoid black frames
-        start_offset = duration * 0.05
-        end_offset = duration * 0.95
-        usable_duration = end_offset - start_offset
-        
-        if usable_duration <= 0:
-            # For very short videos, just take middle frame
-            timestamps = [duration / 2]
-        else:
-            interval = usable_duration / (num_screenshots + 1)
-            timestamps = [start_offset + interval * (i + 1) for i in range(num_screenshots)]
-        
-        ffmpeg_cmd = get_ffmpeg_path()
-        logger.info(f"Using FFmpeg at: {ffmpeg_cmd}")
-        logger.info(f"Extracting {len(timestamps)} screenshots from video")
-        
-        import subprocess
-        
-        # Extract screenshots at each timestamp
-        for i, timestamp in enumerate(timestamps):
-            output_path = os.path.join(output_dir, f"screenshot_{i+1}.jpg")
+        async with _ffmpeg_slots:
+            # Get video duration
+            if not duration:
+                duration = await get_video_duration(video_path)
+            if duration is None or duration <= 0:
+                logger.error("Could not determine video duration")
+                return []
+            
+            # Create output directory if not provided
+            if output_dir is None:
+                output_dir = tempfile.mkdtemp(prefix="screenshots_")
             
-            cmd = [
-                ffmpeg_cmd,
-                '-ss', str(timestamp),
-                '-i', video_path,
-                '-vframes', '1',
-                '-q:v', '2',  # High quality JPEG
-                '-y',  # Overwrite output file
-                output_path
-            ]
+            # Calculate timestamps for equidistant screenshots
+            # Skip first and last 5% to avoid black frames
+            start_offset = duration * 0.05
+            end_offset = duration * 0.95
+            usable_duration = end_offset - start_offset
+            
+            if usable_duration <= 0:
+                # For very short videos, just take middle frame
+                timestamps = [duration / 2]
+            else:
+                interval = usable_duration / (num_screenshots + 1)
+                timestamps = [start_offset + interval * (i + 1) for i in range(num_screenshots)]
             
-            logger.info(f"Extracting screenshot {i+1} at {timestamp:.2f}s")
+            ffmpeg_cmd = get_ffmpeg_path()
+            logger.info(f"Using FFmpeg at: {ffmpeg_cmd}")
+            logger.info(f"Extracting {len(timestamps)} screenshots from video")
             
+            cmd = [ffmpeg_cmd, '-v', 'error']
+            for timestamp in timestamps:
+                cmd += ['-ss', f"{timestamp:.3f}", '-i', video_path]
+            
+            output_paths = []
+            for i in range(len(timestamps)):
+                output_path = os.path.join(output_dir, f"screenshot_{i+1}.jpg")
+                output_paths.append(output_path)
+                cmd += [
+                    '-map', f'{i}:v:0',
+                    '-frames:v', '1',
+                    '-q:v', '2',  # High quality JPEG
+                    '-y',  # Overwrite output file
+                    output_path
+                ]
+            
+            started = time.perf_counter()
             try:
-                # Use subprocess.run for better Windows compatibility
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=60
-                )
-                
-                if result.returncode == 0 and os.path.exists(output_path):
+                returncode, _, stderr = await run_process(cmd, timeout=SCREENSHOT_TIMEOUT)
+                ffmpeg_seconds.observe(time.perf_counter() - started, "ok" if returncode == 0 else "error")
+                if returncode != 0:
+                    logger.error(f"FFmpeg return code: {returncode}")
+                    logger.error(f"Error: {stderr.decode(errors='replace')}")
+            except asyncio.TimeoutError:
+                ffmpeg_seconds.observe(time.perf_counter() - started, "timeout")
+                logger.error(f"Timeout extracting screenshots after {SCREENSHOT_TIMEOUT}s")
+            
+            # Keep whatever frames were written, even if FFmpeg failed part way
+            for i, output_path in enumerate(output_paths):
+                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                     screenshot_paths.append(output_path)
-                    logger.info(f"✓ Extracted screenshot {i+1} successfully")
+                    logger.info(f"✓ Extracted screenshot {i+1} at {timestamps[i]:.2f}s")
                 else:
-                    logger.error(f"Failed to extract screenshot at {timestamp}s")
-                    logger.error(f"Return code: {result.returncode}")
-                    logger.error(f"Error: {result.stderr.decode()}")
-            except subprocess.TimeoutExpired:
-                logger.error(f"Timeout extracting screenshot {i+1}")
-            except Exception as e:
-                logger.error(f"Exception extracting screenshot {i+1}: {type(e).__name__}: {e}")
+                    logger.error(f"Failed to extract screenshot at {timestamps[i]}s")
         
         return screenshot_paths
         
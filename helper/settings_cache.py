@@ -0,0 +1,129 @@
+#(©) Codeflix_Bots - In-process settings cache
+
+import asyncio
+from config import SHORT_URL, SHORT_API, SHORT_TUT, SETTINGS_POLL_INTERVAL, OWNER_ID
+
+#===============================================================#
+
+class SettingsCache:
+    """
+    In-memory copy of the settings documents: bot, messages, admins, shortner
+    and access token settings.
+
+    Everything is loaded once at startup with load_all_settings, so reading a
+    setting never waits on Mongo. Writes from the panels go through the
+    update_* / set_admins methods, which save to Mongo and update the copy
+    together. Stored values are laid over the config values the bot was
+    started with and copied onto the client (messages, reply_text, protect,
+    auto_del, admins), where the handlers read them.
+
+    Every settings write also bumps a version counter in Mongo. Every
+    SETTINGS_POLL_INTERVAL seconds that one small document is read, and
+    everything is reloaded when another process changed something. Bumps
+    made by this process's own writes don't cause a reload, and a reload
+    that fails keeps the current settings instead of falling back to config.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.version = None
+        self._data = {
+            "bot_settings": {},
+            "messages": {},
+            "admins": [],
+            "shortner_settings": {},
+            "access_token_settings": {"enabled": False, "validity_hours": 12},
+        }
+        self._defaults = {
+            "messages": dict(client.messages),
+            "admins": list(client.admins),
+            "bot_settings": {"protect": client.protect, "auto_del": client.auto_del},
+        }
+        self._task = None
+
+    async def load(self):
+        data = await self.client.mongodb.load_all_settings()
+        version = data.pop("version")
+        if version is None and self.version is not None:
+            # Mongo failed mid-run, the defaults it returned would reset live settings
+            self.client.LOGGER(__name__, self.client.name).warning("Settings reload failed, keeping the current settings")
+            return
+        self.version = version
+        self._data = data
+        self._apply()
+
+    def _written(self, version):
+        # Our own bump, straight after the version we hold: nothing else changed in between
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+
+    def _apply(self):
+        # Older code reads these off the client directly
+        shortner_settings = self._data["shortner_settings"]
+        self.client.short_url = shortner_settings.get('short_url', SHORT_URL)
+        self.client.short_api = shortner_settings.get('short_api', SHORT_API)
+        self.client.tutorial_link = shortner_settings.get('tutorial_link', SHORT_TUT)
+        self.client.shortner_enabled = shortner_settings.get('enabled', True)
+
+        self.client.messages = dict(self._defaults["messages"], **self._data["messages"])
+        self.client.reply_text = self.client.messages.get('REPLY', 'Do not send any useless message in the bot.')
+        for key, default in self._defaults["bot_settings"].items():
+            setattr(self.client, key, self._data["bot_settings"].get(key, default))
+        admins = list(self._data["admins"] or self._defaults["admins"])
+        self.client.admins = admins if OWNER_ID in admins else admins + [OWNER_ID]
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SETTINGS_POLL_INTERVAL)
+            try:
+                if await self.client.mongodb.get_settings_version() != self.version:
+                    await self.load()
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"Error refreshing settings: {e}")
+
+    # Reads
+
+    def access_token_settings(self) -> dict:
+        return self._data["access_token_settings"]
+
+    def shortner_settings(self) -> dict:
+        return self._data["shortner_settings"]
+
+    # Writes
+
+    async def update_access_token_setting(self, key: str, value):
+        self._written(await self.client.mongodb.update_access_token_setting(key, value))
+        self._data["access_token_settings"] = dict(self._data["access_token_settings"], **{key: value})
+
+    async def update_shortner_setting(self, key: str, value):
+        self._written(await self.client.mongodb.update_shortner_setting(key, value))
+        self._data["shortner_settings"] = dict(self._data["shortner_settings"], **{key: value})
+        self._apply()
+
+    async def update_bot_setting(self, key: str, value):
+        self._written(await self.client.mongodb.update_bot_setting(key, value))
+        self._data["bot_settings"] = dict(self._data["bot_settings"], **{key: value})
+        self._apply()
+
+    async def update_message_setting(self, key: str, value: str):
+        self._written(await self.client.mongodb.update_message_setting(key, value))
+        self._data["messages"] = dict(self._data["messages"], **{key: value})
+        self._apply()
+
+    async def set_admins(self, admins: list):
+        self._written(await self.client.mongodb.set_admins_list(admins))
+        self._data["admins"] = list(admins)
+        self._apply()
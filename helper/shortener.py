@@ -0,0 +1,177 @@
+#(©) Codeflix_Bots - Async URL shortener client
+
+import asyncio
+import hashlib
+import random
+import string
+import time
+import aiohttp
+from helper.cache import TTLCache
+from helper.metrics import shortener_lookups
+from config import (
+    SHORTENER_TIMEOUT, SHORTENER_RETRIES, SHORTENER_CACHE_SIZE, SHORTENER_CACHE_TTL,
+    SHORTENER_BREAKER_THRESHOLD, SHORTENER_BREAKER_RESET,
+)
+
+#===============================================================#
+
+def generate_random_alphanumeric():
+    characters = string.ascii_letters + string.digits
+    return ''.join(random.choice(characters) for _ in range(8))
+
+
+class ShortenerUnavailable(Exception):
+    """Raised when the shortener keeps failing or the circuit breaker is open"""
+
+#===============================================================#
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and stays open for `reset_after`
+    seconds. After that a single trial call is let through: success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 60):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.reset_after or self._trial:
+            return False
+        self._trial = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+#===============================================================#
+
+class Shortener:
+    """
+    Shortens links through an AdLinkFly style `/api` endpoint.
+
+    Uses one pooled aiohttp session. Failed requests are retried with jittered
+    exponential backoff, and a circuit breaker stops calling a dead shortener
+    altogether. Results are kept in a TTL/LRU cache backed by the `short_links`
+    collection, so a link is only shortened once per shortener account
+    (domain plus a hash of the API key).
+    """
+
+    def __init__(self, mongodb):
+        self.mongodb = mongodb
+        self.cache = TTLCache(SHORTENER_CACHE_SIZE, SHORTENER_CACHE_TTL)
+        self.breaker = CircuitBreaker(SHORTENER_BREAKER_THRESHOLD, SHORTENER_BREAKER_RESET)
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=SHORTENER_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def request(self, short_url: str, short_api: str, url: str, alias: str = None, timeout: float = None):
+        """Single call to the shortener API, returns (http status, json body)"""
+        params = {"api": short_api, "url": url, "alias": alias or generate_random_alphanumeric()}
+        request_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        async with self._get_session().get(f"https://{short_url}/api", params=params, timeout=request_timeout) as response:
+            # Many shorteners answer JSON with a text/html content type
+            rjson = await response.json(content_type=None)
+            if rjson is None:
+                rjson = {}
+            if not isinstance(rjson, dict):
+                raise ValueError(f"Unexpected response body: {str(rjson)[:100]}")
+            return response.status, rjson
+
+    async def _shorten_remote(self, short_url: str, short_api: str, url: str) -> str:
+        for attempt in range(SHORTENER_RETRIES + 1):
+            try:
+                status, rjson = await self.request(short_url, short_api, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                print(f"[Shortener Error] attempt {attempt + 1}: {e!r}")
+            else:
+                if status == 200 and rjson.get("status") == "success":
+                    return rjson.get("shortenedUrl", url)
+                print(f"[Shortener Error] HTTP {status}: {rjson.get('message', rjson)}")
+                # Only overloads are worth retrying, anything else is a config problem
+                if status not in (429, 500, 502, 503, 504):
+                    break
+            if attempt < SHORTENER_RETRIES:
+                await asyncio.sleep(0.5 * 2 ** attempt + random.uniform(0, 0.5))
+        raise ShortenerUnavailable(short_url)
+
+    async def shorten(self, url: str, short_url: str, short_api: str) -> str:
+        """Return a short link for `url`, or `url` itself if the shortener can't be used."""
+        # Links belong to the account that made them, so a new API key starts a fresh cache
+        api_hash = hashlib.sha256((short_api or "").encode()).hexdigest()[:16]
+        key = (short_url, api_hash, url)
+        cached = self.cache.get(key)
+        if cached:
+            shortener_lookups.inc("memory")
+            return cached
+
+        try:
+            cached = await self.mongodb.get_short_link(short_url, api_hash, url)
+        except Exception as e:
+            print(f"[Shortener Warning] Cache lookup failed: {e}")
+            cached = None
+        if cached:
+            shortener_lookups.inc("mongo")
+            self.cache.set(key, cached)
+            return cached
+
+        if not self.breaker.allow():
+            shortener_lookups.inc("fallback")
+            return url
+        succeeded = False
+        try:
+            shortened_url = await self._shorten_remote(short_url, short_api, url)
+            succeeded = True
+        except Exception as e:
+            if not isinstance(e, ShortenerUnavailable):
+                print(f"[Shortener Error] Unexpected failure: {e!r}")
+            shortener_lookups.inc("fallback")
+            return url
+        finally:
+            # Settled on every exit, so a trial call can never leave the breaker half-open
+            if succeeded:
+                self.breaker.success()
+            else:
+                self.breaker.failure()
+
+        # Validate that the shortened URL is a proper URL for Telegram buttons
+        if not isinstance(shortened_url, str) or not shortened_url.startswith(("https://", "http://")):
+            print(f"[Shortener Warning] Invalid URL returned: {shortened_url}")
+            shortener_lookups.inc("fallback")
+            return url
+
+        shortener_lookups.inc("remote")
+        self.cache.set(key, shortened_url)
+        try:
+            await self.mongodb.save_short_link(short_url, api_hash, url, shortened_url)
+        except Exception as e:
+            print(f"[Shortener Warning] Could not persist short link: {e}")
+        return shortened_url
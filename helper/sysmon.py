@@ -0,0 +1,110 @@
+#(©) Codeflix_Bots - Background system sampler for /stats
+
+import asyncio
+import shutil
+import time
+from collections import deque
+import psutil
+from config import SYSMON_INTERVAL, SYSMON_COUNT_INTERVAL
+
+#===============================================================#
+
+HISTORY_SECONDS = 3600
+
+class SystemMonitor:
+    """
+    Samples CPU, RAM, swap, disk, network and event loop lag every
+    SYSMON_INTERVAL seconds, and the user count every SYSMON_COUNT_INTERVAL.
+
+    psutil is only ever asked for the usage since the previous sample (never
+    with interval=...), and the calls run in a worker thread, so nothing here
+    blocks the event loop. /stats renders straight from `latest` and the
+    rolling history, which keeps an hour of samples for the 1m/5m/1h averages.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.latest = None
+        self.total_users = None
+        self.history = deque(maxlen=HISTORY_SECONDS // SYSMON_INTERVAL)
+        self._process = psutil.Process()
+        self._last_net = None
+        self._counted_at = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            # Prime the counters, the first cpu_percent(None) call always returns 0.0
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(SYSMON_INTERVAL)
+            # Anything past the requested sleep is time the loop was busy elsewhere
+            lag_ms = max(0.0, (loop.time() - started - SYSMON_INTERVAL) * 1000)
+            try:
+                await self.sample(lag_ms)
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"System sample failed: {e}")
+
+    def _read_system(self) -> dict:
+        now = time.time()
+        ram = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        disk = shutil.disk_usage("/")
+        snapshot = {
+            "time": now,
+            "cpu": psutil.cpu_percent(interval=None),
+            "bot_cpu": self._process.cpu_percent(interval=None),
+            "bot_memory": self._process.memory_info().rss,
+            "ram_total": ram.total, "ram_used": ram.used, "ram_available": ram.available, "ram_percent": ram.percent,
+            "swap_total": swap.total, "swap_used": swap.used, "swap_free": swap.free, "swap_percent": swap.percent,
+            "disk_total": disk.total, "disk_used": disk.used, "disk_free": disk.free,
+            "net_sent": None, "net_recv": None, "net_sent_rate": None, "net_recv_rate": None,
+        }
+        try:
+            net = psutil.net_io_counters()
+            snapshot["net_sent"], snapshot["net_recv"] = net.bytes_sent, net.bytes_recv
+            if self._last_net:
+                elapsed = max(now - self._last_net[0], 1e-6)
+                snapshot["net_sent_rate"] = (net.bytes_sent - self._last_net[1]) / elapsed
+                snapshot["net_recv_rate"] = (net.bytes_recv - self._last_net[2]) / elapsed
+            self._last_net = (now, net.bytes_sent, net.bytes_recv)
+        except PermissionError:
+            pass
+        return snapshot
+
+    async def sample(self, lag_ms: float = 0.0):
+        snapshot = await asyncio.to_thread(self._read_system)
+        snapshot["loop_lag_ms"] = lag_ms
+        self.latest = snapshot
+        self.history.append(snapshot)
+
+        if time.monotonic() - self._counted_at >= SYSMON_COUNT_INTERVAL:
+            self._counted_at = time.monotonic()
+            try:
+                self.total_users = await self.client.mongodb.count_users()
+            except Exception as e:
+                self.client.LOGGER(__name__, self.client.name).warning(f"Error counting users: {e}")
+
+    def averages(self, seconds: int) -> dict:
+        """Mean cpu, bot_cpu, ram_percent and loop_lag_ms over the last `seconds`, or None without samples"""
+        since = time.time() - seconds
+        window = [s for s in self.history if s["time"] >= since]
+        if not window:
+            return None
+        keys = ("cpu", "bot_cpu", "ram_percent", "loop_lag_ms")
+        return {key: sum(s[key] for s in window) / len(window) for key in keys}
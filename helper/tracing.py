@@ -0,0 +1,153 @@
+#(©) Codeflix_Bots - Sampled request tracing
+
+import functools
+import inspect
+import json
+import logging
+import queue
+import random
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from config import TRACE_SAMPLE_RATE, TRACE_FILE, TRACE_RESERVOIR
+
+#===============================================================#
+
+_current = ContextVar("trace", default=None)
+
+# Latest TRACE_RESERVOIR durations (ms) of every stage, for the percentiles
+stage_timings = {}
+
+_trace_log = None
+
+def _writer() -> logging.Logger:
+    """`trace` logger that appends one JSON line per trace from a background thread"""
+    global _trace_log
+    if _trace_log is None:
+        file_handler = RotatingFileHandler(TRACE_FILE, maxBytes=20_000_000, backupCount=3)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_queue = queue.SimpleQueue()
+        listener = QueueListener(trace_queue, file_handler)
+        listener.start()
+        logger = logging.getLogger("trace")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(QueueHandler(trace_queue))
+        _trace_log = logger
+    return _trace_log
+
+
+def _record(stage: str, ms: float):
+    timings = stage_timings.get(stage)
+    if timings is None:
+        timings = stage_timings[stage] = deque(maxlen=TRACE_RESERVOIR)
+    timings.append(ms)
+
+#===============================================================#
+
+class Trace:
+    __slots__ = ("id", "name", "started", "attrs", "spans")
+
+    def __init__(self, name: str, attrs: dict):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.attrs = attrs
+        self.spans = []
+
+
+@asynccontextmanager
+async def trace(name: str, **attrs):
+    """
+    Root of one request. Only TRACE_SAMPLE_RATE of them are recorded; for the
+    rest every span inside is a no-op.
+    """
+    if _current.get() is not None or random.random() >= TRACE_SAMPLE_RATE:
+        yield
+        return
+    current = Trace(name, attrs)
+    token = _current.set(current)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        ms = (time.perf_counter() - current.started) * 1000
+        _record(name, ms)
+        _writer().info(json.dumps({
+            "trace": current.id,
+            "name": name,
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "ms": round(ms, 2),
+            "error": error,
+            **current.attrs,
+            "spans": current.spans,
+        }, default=str))
+
+
+@asynccontextmanager
+async def span(name: str):
+    """Time a stage of the current trace (does nothing when the request isn't sampled)"""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        _record(name, ms)
+        current.spans.append({
+            "name": name,
+            "at": round((started - current.started) * 1000, 2),
+            "ms": round(ms, 2),
+            "error": error,
+        })
+
+
+def traced(name: str):
+    """Decorator form of span() for coroutine functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await func(*args, **kwargs)
+            async with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls, prefix: str):
+    """Wrap every public coroutine method of `cls` in a `{prefix}.{method}` span"""
+    for attr, func in list(vars(cls).items()):
+        if not attr.startswith("_") and inspect.iscoroutinefunction(func):
+            setattr(cls, attr, traced(f"{prefix}.{attr}")(func))
+    return cls
+
+#===============================================================#
+
+def _percentile(values: list, pct: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def stage_summary() -> list:
+    """(stage, samples, p50, p95, p99) in ms for every stage seen, slowest p95 first"""
+    rows = []
+    for stage, timings in list(stage_timings.items()):
+        values = sorted(timings)
+        if values:
+            rows.append((stage, len(values), _percentile(values, 50), _percentile(values, 95), _percentile(values, 99)))
+    return sorted(rows, key=lambda row: row[3], reverse=True)
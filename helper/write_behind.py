@@ -0,0 +1,107 @@
+#(©) Codeflix_Bots - Write-behind queue for status bookkeeping
+
+import asyncio
+from config import LOGGER
+
+#===============================================================#
+
+class WriteBehindQueue:
+    """
+    Buffers Mongo writes in memory and flushes them in the background.
+
+    Writes are keyed per document, so only the last write for a given
+    (collection, key) survives until the next flush. A flush runs every
+    `flush_interval` seconds, or as soon as `max_pending` documents are waiting.
+
+    A batch that fails to write is queued again unless a newer write for the
+    same document arrived meanwhile. The queue is capped at MAX_REQUEUE times
+    `max_pending` documents, and anything past that is dropped and logged.
+    """
+
+    MAX_REQUEUE = 10
+
+    def __init__(self, mongodb, max_pending: int = 500, flush_interval: float = 2.0):
+        self.mongodb = mongodb
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._wakeup = None
+        self._task = None
+        self._lock = None
+
+    def put(self, name: str, key: tuple, op):
+        """Queue `op` for collection `name`; replaces any queued write with the same key."""
+        self._pending[(name,) + tuple(key)] = (name, op)
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def discard(self, name: str, key: tuple):
+        """
+        Drop the queued write for (name, key) before writing that document directly,
+        and wait out a flush in progress, so an older queued write can't land after it.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Popped under the lock, after a flush in progress is done, so a failed
+        # flush can't put the stale write back once it has been dropped
+        async with self._lock:
+            self._pending.pop((name,) + tuple(key), None)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write out everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await self.mongodb.apply_status_ops(list(batch.values()))
+            except Exception as e:
+                self._requeue(batch, e)
+
+    def _requeue(self, batch: dict, error: Exception):
+        room = self.max_pending * self.MAX_REQUEUE - len(self._pending)
+        requeued, dropped = 0, []
+        for key, write in batch.items():
+            if key in self._pending:
+                continue  # a newer write for this document replaces the failed one
+            if room > 0:
+                self._pending[key] = write
+                requeued += 1
+                room -= 1
+            else:
+                dropped.append(key)
+        logger = LOGGER(__name__, "status_writes")
+        logger.warning(f"Write-behind flush failed for {len(batch)} writes, {requeued} queued again: {error}")
+        if dropped:
+            logger.error(f"Dropped {len(dropped)} status writes, queue is full: {dropped[:50]}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Shielded so stop() can't cancel a batch halfway through its bulk_write
+            await asyncio.shield(self.flush())
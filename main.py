@@ -41,4 +41,5 @@ async def runner():
         web_app()
     )
 
+setup_logging()
 asyncio.run(runner())
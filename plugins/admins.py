@@ -2,8 +2,8 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 import time
 
-import psutil
-import shutil
+from helper.tracing import stage_summary
+from config import TRACE_SAMPLE_RATE
 
 #===============================================================#
 
@@ -29,14 +29,13 @@ async def usage_cmd(client: Client, message: Message):
     if not message.from_user.id in client.admins:
         return await message.reply("✗ ᴛʜɪs ᴄᴀɴ ᴏɴʟʏ ʙᴇ ᴜsᴇᴅ ʙʏ ᴀᴅᴍɪɴs!")
     
-    reply = await message.reply("<blockquote>›› ᴇxᴛʀᴀᴄᴛɪɴɢ ᴜsᴀɢᴇ ᴅᴀᴛᴀ...</blockquote>")
-
-    # Get total users from database
-    try:
-        total_users_list = await client.mongodb.full_userbase()
-        total_users = len(total_users_list)
-    except Exception as e:
-        total_users = "ᴇʀʀᴏʀ"
+    # Everything below comes from the background sampler, nothing is measured here
+    sysmon = client.sysmon
+    if sysmon.latest is None:
+        await sysmon.sample()
+    stats = sysmon.latest
+    # Exact count from the sampler (first taken on its first sample), "…" until it has one
+    total_users = sysmon.total_users if sysmon.total_users is not None else "…"
 
     # Bot uptime calculation
     from datetime import datetime, timedelta
@@ -47,48 +46,52 @@ async def usage_cmd(client: Client, message: Message):
     uptime_str = f"{days}ᴅ {hours}ʜ {minutes}ᴍ"
 
     # System stats
-    total, used, free = shutil.disk_usage("/")
-    total_gb = total / (1024**3)
-    used_gb = used / (1024**3)
-    free_gb = free / (1024**3)
-    disk_percent = (used / total) * 100
-
-    ram = psutil.virtual_memory()
-    total_ram = ram.total / (1024**3)
-    used_ram = ram.used / (1024**3)
-    free_ram = ram.available / (1024**3)
-    ram_percent = ram.percent
-
-    swap = psutil.swap_memory()
-    total_swap = swap.total / (1024**3)
-    used_swap = swap.used / (1024**3)
-    free_swap = swap.free / (1024**3)
-    swap_percent = swap.percent
-
-    cpu_usage = psutil.cpu_percent(interval=1)
-
-    # Network stats with error handling
-    try:
-        net_io = psutil.net_io_counters()
-        bytes_sent = net_io.bytes_sent / (1024**2)
-        bytes_recv = net_io.bytes_recv / (1024**2)
+    total_gb = stats["disk_total"] / (1024**3)
+    used_gb = stats["disk_used"] / (1024**3)
+    free_gb = stats["disk_free"] / (1024**3)
+    disk_percent = (stats["disk_used"] / stats["disk_total"]) * 100
+
+    total_ram = stats["ram_total"] / (1024**3)
+    used_ram = stats["ram_used"] / (1024**3)
+    free_ram = stats["ram_available"] / (1024**3)
+    ram_percent = stats["ram_percent"]
+
+    total_swap = stats["swap_total"] / (1024**3)
+    used_swap = stats["swap_used"] / (1024**3)
+    free_swap = stats["swap_free"] / (1024**3)
+    swap_percent = stats["swap_percent"]
+
+    cpu_usage = stats["cpu"]
+
+    # Network stats
+    if stats["net_sent"] is not None:
+        bytes_sent = stats["net_sent"] / (1024**2)
+        bytes_recv = stats["net_recv"] / (1024**2)
         network_status = "✓ ᴀᴠᴀɪʟᴀʙʟᴇ"
         net_section = f"""<blockquote>›› **ᴜᴘʟᴏᴀᴅᴇᴅ:** `{bytes_sent:.2f} ᴍʙ`
-›› **ᴅᴏᴡɴʟᴏᴀᴅᴇᴅ:** `{bytes_recv:.2f} ᴍʙ`</blockquote>"""
-    except PermissionError:
+›› **ᴅᴏᴡɴʟᴏᴀᴅᴇᴅ:** `{bytes_recv:.2f} ᴍʙ`"""
+        if stats["net_sent_rate"] is not None:
+            net_section += f"""
+›› **ʀᴀᴛᴇ:** `↑ {stats['net_sent_rate'] / 1024:.1f} / ↓ {stats['net_recv_rate'] / 1024:.1f} ᴋʙ/s`"""
+        net_section += "</blockquote>"
+    else:
         network_status = "✗ ɴᴏᴛ ᴀᴠᴀɪʟᴀʙʟᴇ"
         net_section = "<blockquote>›› **sᴛᴀᴛᴜs:** `ɴᴏᴛ ᴀᴠᴀɪʟᴀʙʟᴇ ᴏɴ ᴘʀᴏᴏᴛ`</blockquote>"
 
     # Bot process usage
-    try:
-        process = psutil.Process()
-        bot_cpu_usage = process.cpu_percent(interval=1)
-        bot_memory_usage = process.memory_info().rss / (1024**2)
-        bot_status = "✓ ʀᴜɴɴɪɴɢ"
-    except Exception:
-        bot_cpu_usage = 0.0
-        bot_memory_usage = 0.0
-        bot_status = "✗ ᴇʀʀᴏʀ"
+    bot_cpu_usage = stats["bot_cpu"]
+    bot_memory_usage = stats["bot_memory"] / (1024**2)
+    bot_status = "✓ ʀᴜɴɴɪɴɢ"
+
+    # 1m / 5m / 1h averages
+    history_lines = []
+    for label, key, unit in (("ᴄᴘᴜ", "cpu", "%"), ("ʙᴏᴛ ᴄᴘᴜ", "bot_cpu", "%"), ("ʀᴀᴍ", "ram_percent", "%"), ("ʟᴏᴏᴘ ʟᴀɢ", "loop_lag_ms", " ᴍs")):
+        values = []
+        for seconds in (60, 300, 3600):
+            averages = sysmon.averages(seconds)
+            values.append(f"{averages[key]:.1f}{unit}" if averages else "-")
+        history_lines.append(f"›› **{label}:** `{' / '.join(values)}`")
+    history_section = "\n".join(history_lines)
 
     # Status indicators based on usage levels
     disk_status = "✓ ɴᴏʀᴍᴀʟ" if disk_percent < 80 else "✗ ʜɪɢʜ" if disk_percent < 95 else "✗ ᴄʀɪᴛɪᴄᴀʟ"
@@ -128,11 +131,33 @@ async def usage_cmd(client: Client, message: Message):
 
 <blockquote><u>**≡ ʙᴏᴛ ʀᴇsᴏᴜʀᴄᴇ ᴜsᴀɢᴇ:**</u></blockquote>
 <blockquote>›› **ᴄᴘᴜ:** `{bot_cpu_usage:.2f}%`
-›› **ᴍᴇᴍᴏʀʏ:** `{bot_memory_usage:.2f} ᴍʙ`</blockquote>
+›› **ᴍᴇᴍᴏʀʏ:** `{bot_memory_usage:.2f} ᴍʙ`
+›› **ʟᴏᴏᴘ ʟᴀɢ:** `{stats['loop_lag_ms']:.1f} ᴍs`</blockquote>
+
+<blockquote><u>**≡ ʜɪsᴛᴏʀʏ (1ᴍ / 5ᴍ / 1ʜ):**</u></blockquote>
+<blockquote>{history_section}</blockquote>
 
 <blockquote>**• ᴜsᴇ ᴛʜɪs ɪɴꜰᴏʀᴍᴀᴛɪᴏɴ ᴛᴏ ᴍᴏɴɪᴛᴏʀ ʏᴏᴜʀ ʙᴏᴛ's ᴘᴇʀꜰᴏʀᴍᴀɴᴄᴇ!**</blockquote>"""
 
-    await reply.edit_text(msg)
+    await message.reply(msg)
+#===============================================================#
+
+@Client.on_message(filters.command("traces") & filters.private)
+async def traces_cmd(client: Client, message: Message):
+    if not message.from_user.id in client.admins:
+        return await message.reply("✗ ᴛʜɪs ᴄᴀɴ ᴏɴʟʏ ʙᴇ ᴜsᴇᴅ ʙʏ ᴀᴅᴍɪɴs!")
+
+    rows = stage_summary()
+    if not rows:
+        return await message.reply(f"<blockquote>›› ɴᴏ ᴛʀᴀᴄᴇs ʏᴇᴛ</blockquote>\nsᴀᴍᴘʟᴇ ʀᴀᴛᴇ: `{TRACE_SAMPLE_RATE:.0%}`")
+
+    lines = [f"{'stage':<34}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}"]
+    for stage, count, p50, p95, p99 in rows[:40]:
+        lines.append(f"{stage[:33]:<34}{count:>6}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+    await message.reply(
+        f"<blockquote>✦ sᴛᴀɢᴇ ʟᴀᴛᴇɴᴄʏ (ᴍs), sᴀᴍᴘʟᴇ ʀᴀᴛᴇ {TRACE_SAMPLE_RATE:.0%}</blockquote>\n<pre>" + "\n".join(lines) + "</pre>"
+    )
+
 #===============================================================#
 
 @Client.on_callback_query(filters.regex("^add_admin$"))
@@ -144,9 +169,11 @@ async def add_new_admins(client: Client, query: CallbackQuery):
     ids = ids_msg.text.split()
     
     try:
+        new_admins = list(client.admins)
         for identifier in ids:
-            if int(identifier) not in client.admins:
-                client.admins.append(int(identifier))
+            if int(identifier) not in new_admins:
+                new_admins.append(int(identifier))
+        await client.settings.set_admins(new_admins)
             
     except Exception as e:
         return await ids_msg.reply(f"Error: {e}")
@@ -164,12 +191,14 @@ async def remove_admins(client: Client, query: CallbackQuery):
     ids = ids_msg.text.split()
     
     try:
+        new_admins = list(client.admins)
         for identifier in ids:
             if int(identifier) == client.owner:
                 await client.send_message(query.from_user.id, "Nigga i can never remove the owner from the admin list!!")
                 continue
-            if int(identifier) in client.admins:
-                client.admins.remove(int(identifier))
+            if int(identifier) in new_admins:
+                new_admins.remove(int(identifier))
+        await client.settings.set_admins(new_admins)
     except Exception as e:
         return await ids_msg.reply(f"Error: {e}")
     await admins(client, query)
@@ -4,8 +4,16 @@ import tempfile
 from pyrogram import filters, Client
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
 from pyrogram.errors import FloodWait
-from helper.helper_func import encode
+from helper.links import encode_link
 from helper.screenshot_helper import extract_screenshots, cleanup_temp_files, check_ffmpeg_installed
+from helper.media_stream import extract_streaming_screenshots
+from helper.message_cache import invalidate, index_messages
+from config import STREAM_SCREENSHOTS
+
+NUM_SCREENSHOTS = 4
+
+# Keeps background video uploads referenced until they finish
+_video_uploads = set()
 
 #===============================================================#
 
@@ -24,20 +32,32 @@ async def process_video_with_screenshots(client: Client, message: Message, reply
             client.LOGGER(__name__, client.name).warning("FFmpeg not installed, skipping screenshot extraction")
             return None, []
         
-        await reply_text.edit_text("📥 Downloading video...")
-        
-        # Download the video to a temporary file
-        temp_dir = tempfile.mkdtemp(prefix="video_")
-        video_path = await message.download(file_name=os.path.join(temp_dir, "video"))
-        
-        if not video_path or not os.path.exists(video_path):
-            client.LOGGER(__name__, client.name).error("Failed to download video")
-            return None, []
-        
-        await reply_text.edit_text("📸 Extracting screenshots...")
+        if STREAM_SCREENSHOTS:
+            await reply_text.edit_text("📸 Extracting screenshots...")
+            # Only the byte ranges around each frame are fetched from Telegram
+            screenshot_paths = await extract_streaming_screenshots(client, message, num_screenshots=NUM_SCREENSHOTS)
         
-        # Extract screenshots from the video
-        screenshot_paths = await extract_screenshots(video_path, num_screenshots=4)
+        if len(screenshot_paths) < NUM_SCREENSHOTS:
+            # Container isn't seekable over HTTP, some frames failed, or streaming is off: download the whole file
+            streamed_paths = screenshot_paths
+            await reply_text.edit_text("📥 Downloading video...")
+            
+            # Download the video to a temporary file
+            temp_dir = tempfile.mkdtemp(prefix="video_")
+            video_path = await message.download(file_name=os.path.join(temp_dir, "video"))
+            
+            if not video_path or not os.path.exists(video_path):
+                client.LOGGER(__name__, client.name).error("Failed to download video")
+                cleanup_temp_files(streamed_paths)
+                return None, []
+            
+            await reply_text.edit_text("📸 Extracting screenshots...")
+            
+            # Extract screenshots from the video, keeping whichever attempt got more frames
+            screenshot_paths = await extract_screenshots(video_path, num_screenshots=NUM_SCREENSHOTS)
+            if len(streamed_paths) > len(screenshot_paths):
+                streamed_paths, screenshot_paths = screenshot_paths, streamed_paths
+            cleanup_temp_files(streamed_paths)
         
         if not screenshot_paths:
             client.LOGGER(__name__, client.name).warning("No screenshots extracted, falling back to normal upload")
@@ -67,6 +87,7 @@ async def process_video_with_screenshots(client: Client, message: Message, reply
                 disable_notification=True
             )
             first_msg_id = screenshot_messages[0].id
+        await index_messages(client, screenshot_messages)
         
         # Upload the original video to DB channel
         try:
@@ -76,11 +97,12 @@ async def process_video_with_screenshots(client: Client, message: Message, reply
             await asyncio.sleep(e.x)
             video_message = await message.copy(chat_id=client.db, disable_notification=True)
             last_msg_id = video_message.id
+        await index_messages(client, [video_message])
         
         # Generate batch link (screenshots + video)
-        string = f"get-{first_msg_id * abs(client.db)}-{last_msg_id * abs(client.db)}"
-        base64_string = await encode(string)
+        base64_string = await encode_link(client, client.db, first_msg_id, last_msg_id)
         link = f"https://t.me/{client.username}?start={base64_string}"
+        client.link_warmer.submit(base64_string)
         
         return link, screenshot_paths
         
@@ -93,73 +115,8 @@ async def process_video_with_screenshots(client: Client, message: Message, reply
             cleanup_temp_files([video_path])
 
 
-@Client.on_message(filters.private & ~filters.command(['start', 'shortner','users','broadcast','batch','genlink','stats', 'pbroadcast', 'db', 'adddb', 'add_db', 'removedb', 'rm_db',  'ban', 'unban', 'addpremium', 'delpremium', 'premiumusers', 'request', 'profile']))
-async def channel_post(client: Client, message: Message):
-    if message.from_user.id not in client.admins:
-        return await message.reply(client.reply_text)
-    
-    reply_text = await message.reply_text("Please Wait...!", quote=True)
-    
-    # Check if message contains a video
-    is_video = bool(message.video or (message.document and message.document.mime_type and message.document.mime_type.startswith('video/')))
-    
-    if is_video:
-        # Process video with screenshot extraction
-        link, screenshot_paths = await process_video_with_screenshots(client, message, reply_text)
-        
-        if link and screenshot_paths:
-            # Delete the "Please wait" message
-            await reply_text.delete()
-            
-            # Send screenshots to the user with the link
-            try:
-                media_group = []
-                caption_text = (
-                    f"<b>Here is your link</b>\n\n"
-                    f"{link}"
-                )
-                
-                for i, ss_path in enumerate(screenshot_paths):
-                    # Add caption only to first screenshot
-                    caption = caption_text if i == 0 else None
-                    media_group.append(InputMediaPhoto(media=ss_path, caption=caption))
-                
-                # Send screenshots to user
-                await client.send_media_group(
-                    chat_id=message.from_user.id,
-                    media=media_group
-                )
-                
-                # Send the share button as a separate message
-                reply_markup = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]
-                ])
-                await message.reply_text(
-                    f"<a href='{link}'>🔗 Batch Link</a>",
-                    reply_markup=reply_markup,
-                    disable_web_page_preview=True
-                )
-                
-                # Cleanup screenshots after sending
-                cleanup_temp_files(screenshot_paths)
-                
-            except Exception as e:
-                client.LOGGER(__name__, client.name).error(f"Error sending screenshots to user: {e}")
-                # Fallback to text only
-                reply_markup = InlineKeyboardMarkup([
-                    [InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]
-                ])
-                await reply_text.edit(
-                    f"<b>✅ Video processed with screenshots!</b>\n\n"
-                    f"<b>📎 Batch Link:</b>\n<code>{link}</code>",
-                    reply_markup=reply_markup,
-                    disable_web_page_preview=True
-                )
-                cleanup_temp_files(screenshot_paths)
-            
-            return
-        # If screenshot extraction failed, fall through to normal processing
-    
+async def store_file(client: Client, message: Message, reply_text: Message):
+    """Copy an admin upload to the DB channel and reply with its link."""
     # Normal file processing (non-video or failed screenshot extraction)
     try:
         post_message = await message.copy(chat_id=client.db, disable_notification=True)
@@ -171,17 +128,104 @@ async def channel_post(client: Client, message: Message):
         await reply_text.edit_text("Something went Wrong..!")
         return
     
-    converted_id = post_message.id * abs(client.db)
-    string = f"get-{converted_id}"
-    base64_string = await encode(string)
+    try:
+        base64_string = await encode_link(client, client.db, post_message.id)
+    except Exception as e:
+        print(e)
+        await reply_text.edit_text("Something went Wrong..!")
+        return
     link = f"https://t.me/{client.username}?start={base64_string}"
+    client.link_warmer.submit(base64_string)
 
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]])
 
     await reply_text.edit(f"<b>Here is your link</b>\n\n{link}", reply_markup=reply_markup, disable_web_page_preview=True)
 
     if not client.disable_btn:
-        await post_message.edit_reply_markup(reply_markup)
+        post_message = await post_message.edit_reply_markup(reply_markup)
+    await index_messages(client, [post_message])
+
+
+async def handle_video_upload(client: Client, message: Message, reply_text: Message):
+    """Upload a video with extracted screenshots, or as a plain file if extraction fails."""
+    # Process video with screenshot extraction
+    link, screenshot_paths = await process_video_with_screenshots(client, message, reply_text)
+    
+    if link and screenshot_paths:
+        # Delete the "Please wait" message
+        await reply_text.delete()
+        
+        # Send screenshots to the user with the link
+        try:
+            media_group = []
+            caption_text = (
+                f"<b>Here is your link</b>\n\n"
+                f"{link}"
+            )
+            
+            for i, ss_path in enumerate(screenshot_paths):
+                # Add caption only to first screenshot
+                caption = caption_text if i == 0 else None
+                media_group.append(InputMediaPhoto(media=ss_path, caption=caption))
+            
+            # Send screenshots to user
+            await client.send_media_group(
+                chat_id=message.from_user.id,
+                media=media_group
+            )
+            
+            # Send the share button as a separate message
+            reply_markup = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]
+            ])
+            await message.reply_text(
+                f"<a href='{link}'>🔗 Batch Link</a>",
+                reply_markup=reply_markup,
+                disable_web_page_preview=True
+            )
+            
+            # Cleanup screenshots after sending
+            cleanup_temp_files(screenshot_paths)
+            
+        except Exception as e:
+            client.LOGGER(__name__, client.name).error(f"Error sending screenshots to user: {e}")
+            # Fallback to text only
+            reply_markup = InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]
+            ])
+            await reply_text.edit(
+                f"<b>✅ Video processed with screenshots!</b>\n\n"
+                f"<b>📎 Batch Link:</b>\n<code>{link}</code>",
+                reply_markup=reply_markup,
+                disable_web_page_preview=True
+            )
+            cleanup_temp_files(screenshot_paths)
+        
+        return
+    
+    # If screenshot extraction failed, fall back to normal processing
+    await store_file(client, message, reply_text)
+
+
+@Client.on_message(filters.private & ~filters.command(['start', 'shortner','users','broadcast','batch','genlink','stats', 'pbroadcast', 'db', 'adddb', 'add_db', 'removedb', 'rm_db',  'ban', 'unban', 'addpremium', 'delpremium', 'premiumusers', 'request', 'profile', 'indexfiles', 'traces']))
+async def channel_post(client: Client, message: Message):
+    if message.from_user.id not in client.admins:
+        return await message.reply(client.reply_text)
+    
+    reply_text = await message.reply_text("Please Wait...!", quote=True)
+    
+    # Check if message contains a video
+    is_video = bool(message.video or (message.document and message.document.mime_type and message.document.mime_type.startswith('video/')))
+    
+    if is_video:
+        # Screenshot extraction can take minutes, so run it in the background
+        # instead of holding one of the bot's update workers
+        task = asyncio.create_task(handle_video_upload(client, message, reply_text))
+        _video_uploads.add(task)
+        task.add_done_callback(_video_uploads.discard)
+        return
+    
+    await store_file(client, message, reply_text)
 
 #===============================================================#
 
@@ -189,22 +233,42 @@ async def channel_post(client: Client, message: Message):
 async def new_post(client: Client, message: Message):
     if message.chat.id != client.db:
         return
+    await index_messages(client, [message])
     if client.disable_btn:
         return
 
-    converted_id = message.id * abs(client.db)
-    string = f"get-{converted_id}"
-    base64_string = await encode(string)
+    base64_string = await encode_link(client, client.db, message.id)
     link = f"https://t.me/{client.username}?start={base64_string}"
+    client.link_warmer.submit(base64_string)
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔁 Share URL", url=f'https://telegram.me/share/url?url={link}')]])
     try:
-        await message.edit_reply_markup(reply_markup)
+        edited = await message.edit_reply_markup(reply_markup)
+        await index_messages(client, [edited])
     except Exception as e:
         print(e)
 
         pass
 
+#===============================================================#
+
+def is_db_channel(client, chat_id):
+    return chat_id == client.db or str(chat_id) in getattr(client, 'db_channels', {})
 
 
+@Client.on_edited_message(filters.channel)
+async def edited_post(client: Client, message: Message):
+    # Re-index so the next /start sends the edited caption/buttons
+    if is_db_channel(client, message.chat.id):
+        invalidate(message.chat.id, [message.id])
+        await index_messages(client, [message])
 
 
+@Client.on_deleted_messages()
+async def deleted_posts(client: Client, messages):
+    deleted = {}
+    for message in messages:
+        if message.chat and is_db_channel(client, message.chat.id):
+            deleted.setdefault(message.chat.id, []).append(message.id)
+    for channel_id, message_ids in deleted.items():
+        invalidate(channel_id, message_ids)
+        await client.mongodb.remove_files(channel_id, message_ids)
@@ -25,6 +25,8 @@ async def handle_join_request(client, join_request: ChatJoinRequest):
         await client.mongodb.add_join_request(user_id, channel_id, getattr(join_request, 'id', None))
         await client.mongodb.update_fsub_status(user_id, channel_id, "request_submitted")
         await client.mongodb.add_channel_user(channel_id, user_id)
+        # A submitted request admits the user, same as check_subscription does
+        client.fsub_cache.mark(user_id, channel_id, ChatMemberStatus.MEMBER)
         
     except Exception as e:
         client.LOGGER(__name__, client.name).error(f"Join request error: {user_id} in {channel_id}: {e}")
@@ -32,7 +34,10 @@ async def handle_join_request(client, join_request: ChatJoinRequest):
 @Client.on_chat_member_updated(filters.channel)
 async def handle_member_update(client, chat_member_updated: ChatMemberUpdated):
     """Handle member status updates for fsub channels"""
-    user_id = chat_member_updated.from_user.id
+    # from_user is whoever made the change (e.g. the admin approving a request),
+    # so prefer the member the update is actually about
+    member = chat_member_updated.new_chat_member or chat_member_updated.old_chat_member
+    user_id = member.user.id if member and member.user else chat_member_updated.from_user.id
     channel_id = chat_member_updated.chat.id
     
     # Only process monitored fsub channels
@@ -42,6 +47,12 @@ async def handle_member_update(client, chat_member_updated: ChatMemberUpdated):
     old_status = chat_member_updated.old_chat_member.status if chat_member_updated.old_chat_member else None
     new_status = chat_member_updated.new_chat_member.status if chat_member_updated.new_chat_member else None
     
+    # Keep the force-sub cache in step with Telegram before touching the database
+    if new_status is None:
+        client.fsub_cache.forget(user_id, channel_id)
+    else:
+        client.fsub_cache.mark(user_id, channel_id, new_status)
+    
     try:
         # Ensure user exists
         if not await client.mongodb.present_user(user_id):
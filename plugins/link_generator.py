@@ -1,6 +1,7 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
-from helper.helper_func import encode, get_message_id
+from helper.helper_func import get_message_id
+from helper.links import encode_link
 from config import LOGGER
 
 async def get_db_channels_info(client):
@@ -86,9 +87,9 @@ async def batch(client: Client, message: Message):
 
     # Use the source channel ID for encoding instead of default primary channel
     client.LOGGER(__name__, client.name).info(f"Generating batch link with source channel: {source_channel_id}, first_msg: {f_msg_id}, last_msg: {s_msg_id}")
-    string = f"get-{f_msg_id * abs(source_channel_id)}-{s_msg_id * abs(source_channel_id)}"
-    base64_string = await encode(string)
+    base64_string = await encode_link(client, source_channel_id, f_msg_id, s_msg_id)
     link = f"https://t.me/{client.username}?start={base64_string}"
+    client.link_warmer.submit(base64_string)
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔁 sʜᴀʀᴇ ᴜʀʟ", url=f'https://telegram.me/share/url?url={link}')]])
     await second_message.reply_text(f"<blockquote>✓ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʙᴀᴛᴄʜ ʟɪɴᴋ</blockquote>\n\n<code>{link}</code>", quote=True, reply_markup=reply_markup)
 
@@ -123,8 +124,9 @@ async def link_generator(client: Client, message: Message):
             await channel_message.reply("<blockquote>✗ ᴇʀʀᴏʀ</blockquote>\n\nᴛʜɪs ꜰᴏʀᴡᴀʀᴅᴇᴅ ᴘᴏsᴛ ɪs ɴᴏᴛ ꜰʀᴏᴍ ᴍʏ ᴅʙ ᴄʜᴀɴɴᴇʟ ᴏʀ ᴛʜɪs ʟɪɴᴋ ɪs ɴᴏᴛ ᴛᴀᴋᴇɴ ꜰʀᴏᴍ ᴅʙ ᴄʜᴀɴɴᴇʟ", quote = True)
             continue
 
-    base64_string = await encode(f"get-{msg_id * abs(source_channel_id)}")
+    base64_string = await encode_link(client, source_channel_id, msg_id)
     link = f"https://t.me/{client.username}?start={base64_string}"
+    client.link_warmer.submit(base64_string)
     reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔁 sʜᴀʀᴇ ᴜʀʟ", url=f'https://telegram.me/share/url?url={link}')]])
     await channel_message.reply_text(f"<blockquote>✓ ʜᴇʀᴇ ɪs ʏᴏᴜʀ ʟɪɴᴋ</blockquote>\n\n<code>{link}</code>", quote=True, reply_markup=reply_markup)
 
@@ -167,9 +169,9 @@ async def nbatch(client: Client, message: Message):
     
     s_msg_id = f_msg_id + batch_size - 1  # Adding batch_size to first message ID
     
-    string = f"get-{f_msg_id * abs(source_channel_id)}-{s_msg_id * abs(source_channel_id)}"
-    base64_string = await encode(string)
+    base64_string = await encode_link(client, source_channel_id, f_msg_id, s_msg_id)
     link = f"https://t.me/{client.username}?start={base64_string}"
+    client.link_warmer.submit(base64_string)
     
     reply_markup = InlineKeyboardMarkup([
         [InlineKeyboardButton("📫 ʏᴏᴜʀ ʙᴀᴛᴄʜ ᴜʀʟ", url=f'https://telegram.me/share/url?url={link}')]
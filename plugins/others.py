@@ -5,6 +5,9 @@ from config import MSG_EFFECT
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors.pyromod import ListenerTimeout
+from pyrogram.errors import FloodWait
+from helper.message_cache import index_messages
+import asyncio
 
 #===============================================================#
 
@@ -228,6 +231,46 @@ async def quick_add_db(client: Client, message: Message):
 
 #===============================================================#
 
+@Client.on_message(filters.command('indexfiles') & filters.private)
+async def index_files_command(client: Client, message: Message):
+    """Backfill the files index from every DB channel"""
+    if message.from_user.id not in client.admins:
+        return await message.reply(client.reply_text)
+    
+    db_channels = getattr(client, 'db_channels', {})
+    channels = [client.db] + [int(c) for c in db_channels.keys() if int(c) != client.db]
+    status = await message.reply("<blockquote>✦ ɪɴᴅᴇxɪɴɢ ᴅʙ ᴄʜᴀɴɴᴇʟs...</blockquote>")
+    total = 0
+    
+    for channel_id in channels:
+        try:
+            # Bots can't read channel history, so a throwaway post tells us the newest message id
+            probe = await client.send_message(channel_id, "Indexing...")
+            last_id = probe.id
+            await probe.delete()
+        except Exception as e:
+            await message.reply(f"**✗ ᴄᴏᴜʟᴅ ɴᴏᴛ ᴀᴄᴄᴇss** `{channel_id}`: `{e}`")
+            continue
+        
+        for batch_start in range(1, last_id, 200):
+            ids = list(range(batch_start, min(batch_start + 200, last_id)))
+            try:
+                msgs = await client.get_messages(channel_id, ids)
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+                msgs = await client.get_messages(channel_id, ids)
+            total += await index_messages(client, msgs)
+            
+            if (batch_start // 200) % 10 == 0:
+                try:
+                    await status.edit(f"<blockquote>✦ ɪɴᴅᴇxɪɴɢ</blockquote>\n›› `{channel_id}`: `{ids[-1]}/{last_id - 1}`\n›› **ɪɴᴅᴇxᴇᴅ:** `{total}`")
+                except Exception:
+                    pass
+    
+    await status.edit(f"**✓ ɪɴᴅᴇxᴇᴅ** `{total}` **ғɪʟᴇs ғʀᴏᴍ** `{len(channels)}` **ᴅʙ ᴄʜᴀɴɴᴇʟ(s)**\n›› **ᴛᴏᴛᴀʟ ɪɴ ɪɴᴅᴇx:** `{await client.mongodb.count_files()}`")
+
+#===============================================================#
+
 @Client.on_message(filters.command(['removedb', 'rm_db']) & filters.private)
 async def quick_remove_db(client: Client, message: Message):
     """Quick command to remove a DB channel"""
@@ -1,21 +1,25 @@
 from aiohttp import web
+import asyncio
+import gzip
+import hashlib
 import markdown
 import os
+from email.utils import formatdate
+from helper.broadcast import broadcast_stats
+from helper.metrics import registry
+from helper.media_stream import media_streams, iter_range
 
 routes = web.RouteTableDef()
 
-@routes.get("/", allow_head=True)
-async def root_route_handler(request):
-    readme_path = os.path.join(os.path.dirname(__file__), "README.md")
-    if not os.path.exists(readme_path):
-        return web.Response(text="README.md not found", status=404)
+# Bots served by this web server, checked by /healthz (Bot.start adds itself)
+clients = []
 
-    with open(readme_path, "r", encoding="utf-8") as f:
-        md_text = f.read()
+README_PATHS = [
+    os.path.join(os.path.dirname(__file__), "README.md"),
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "README.md"),
+]
 
-    html = markdown.markdown(md_text, extensions=["fenced_code", "codehilite", "tables"])
-
-    html_page = f"""
+README_PAGE = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -63,8 +67,147 @@ async def root_route_handler(request):
         {html}
     </body>
     </html>
-    """
-    return web.Response(text=html_page, content_type="text/html")
+"""
+
+# Rendered README, rebuilt only when the file's mtime changes
+_readme = {"path": None, "mtime": None}
+
+
+def _render_readme(path: str, mtime: int) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        md_text = f.read()
+    html = markdown.markdown(md_text, extensions=["fenced_code", "codehilite", "tables"])
+    body = README_PAGE.format(html=html).encode("utf-8")
+    return {
+        "path": path,
+        "mtime": mtime,
+        "body": body,
+        "gzip": gzip.compress(body),
+        "etag": f'"{hashlib.sha1(body).hexdigest()[:20]}"',
+        "last_modified": formatdate(mtime / 1e9, usegmt=True),
+    }
+
+
+async def get_readme():
+    global _readme
+    path = next((p for p in README_PATHS if os.path.exists(p)), None)
+    if path is None:
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if _readme["path"] != path or _readme["mtime"] != mtime:
+        # Markdown + codehilite is slow enough to keep off the event loop
+        _readme = await asyncio.to_thread(_render_readme, path, mtime)
+    return _readme
+
+
+@routes.get("/", allow_head=True)
+async def root_route_handler(request):
+    readme = await get_readme()
+    if readme is None:
+        return web.Response(text="README.md not found", status=404)
+
+    headers = {
+        "ETag": readme["etag"],
+        "Last-Modified": readme["last_modified"],
+        "Cache-Control": "public, max-age=300",
+        "Vary": "Accept-Encoding",
+    }
+    if request.headers.get("If-None-Match") == readme["etag"] or (
+        "If-None-Match" not in request.headers
+        and request.if_modified_since is not None
+        and request.if_modified_since.timestamp() >= int(readme["mtime"] / 1e9)
+    ):
+        return web.Response(status=304, headers=headers)
+
+    body = readme["body"]
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        body = readme["gzip"]
+        headers["Content-Encoding"] = "gzip"
+    return web.Response(body=body, content_type="text/html", charset="utf-8", headers=headers)
+
+
+@routes.get("/healthz", allow_head=True)
+async def health_handler(request):
+    loop = asyncio.get_running_loop()
+    health = {"loop_lag_ms": None, "loop_lag_1m_ms": None, "mongo": None, "telegram": {}}
+    healthy = True
+    if clients:
+        # Measured by the system sampler as the overshoot of its own sleeps
+        sysmon = clients[0].sysmon
+        if sysmon.latest is not None:
+            health["loop_lag_ms"] = round(sysmon.latest["loop_lag_ms"], 2)
+        averages = sysmon.averages(60)
+        if averages:
+            health["loop_lag_1m_ms"] = round(averages["loop_lag_ms"], 2)
+        mongodb = clients[0].mongodb
+        started = loop.time()
+        try:
+            await asyncio.wait_for(mongodb.db.command("ping"), timeout=2)
+            health["mongo"] = {"ok": True, "ms": round((loop.time() - started) * 1000, 2)}
+        except Exception as e:
+            health["mongo"] = {"ok": False, "error": type(e).__name__}
+            healthy = False
+    for client in clients:
+        connected = bool(client.is_connected)
+        health["telegram"][client.name] = connected
+        healthy = healthy and connected
+
+    health["status"] = "ok" if healthy else "degraded"
+    return web.json_response(health, status=200 if healthy else 503)
+
+
+@routes.get("/broadcasts", allow_head=True)
+async def broadcast_stats_handler(request):
+    return web.json_response(broadcast_stats())
+
+
+@routes.get("/metrics")
+async def metrics_handler(request):
+    return web.Response(body=registry.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+@routes.get("/stream/{token}", allow_head=True)
+async def stream_handler(request):
+    entry = media_streams.get(request.match_info["token"])
+    if not entry:
+        return web.Response(text="Stream not found", status=404)
+
+    file_size = entry["file_size"]
+    start, end = 0, file_size - 1
+    status = 200
+    try:
+        http_range = request.http_range
+    except ValueError:
+        return web.Response(status=416, headers={"Content-Range": f"bytes */{file_size}"})
+    if request.headers.get("Range"):
+        start = http_range.start or 0
+        if start < 0:
+            start = max(file_size + start, 0)
+        end = min((http_range.stop or file_size) - 1, file_size - 1)
+        if start > end:
+            return web.Response(status=416, headers={"Content-Range": f"bytes */{file_size}"})
+        status = 206
+
+    headers = {
+        "Content-Type": entry["mime_type"],
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+    }
+    if status == 206:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+
+    response = web.StreamResponse(status=status, headers=headers)
+    await response.prepare(request)
+    if request.method == "HEAD":
+        return response
+
+    try:
+        async for chunk in iter_range(entry["client"], entry["message"], start, end):
+            await response.write(chunk)
+    except ConnectionResetError:
+        # FFmpeg drops the connection as soon as it has read what it needs
+        pass
+    return response
 
 
 app = web.Application()
@@ -454,7 +454,7 @@ __Use the appropriate button below to add or remove any admin based on your need
 
 @Client.on_callback_query(filters.regex("^protect$"))
 async def protect(client, query):
-    client.protect = False if client.protect else True
+    await client.settings.update_bot_setting('protect', not client.protect)
     return await settings(client, query)
 
 #===============================================================#
@@ -474,7 +474,7 @@ __Enter new integer value of auto delete timer, keep 0 to disable auto delete an
         if timer.isdigit() or (timer.startswith('+' or '-') and timer[1:].isdigit()):
             timer = int(timer)
             if timer >= 0:
-                client.auto_del = timer
+                await client.settings.update_bot_setting('auto_del', timer)
                 return await query.message.edit_text(f'**Auto Delete timer vakue changed to {timer} seconds!**', reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'settings')]]))
             else:
                 return await query.message.edit_text("**There is no change done in auto delete timer!**", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'settings')]]))
@@ -509,7 +509,7 @@ async def texts(client, query):
 
 @Client.on_callback_query(filters.regex('^rm_start_photo$'))
 async def rm_start_photo(client, query):
-    client.messages['START_PHOTO'] = ''
+    await client.settings.update_message_setting('START_PHOTO', '')
     await query.answer()
     await photos(client, query)
 
@@ -517,7 +517,7 @@ async def rm_start_photo(client, query):
 
 @Client.on_callback_query(filters.regex('^rm_fsub_photo$'))
 async def rm_fsub_photo(client, query):
-    client.messages['FSUB_PHOTO'] = ''
+    await client.settings.update_message_setting('FSUB_PHOTO', '')
     await query.answer()
     await photos(client, query)
 
@@ -535,11 +535,11 @@ __Enter new link of start image or send the photo, or wait for 60 second timeout
     try:
         res = await client.listen(user_id=query.from_user.id, filters=(filters.text|filters.photo), timeout=60)
         if res.text and res.text.startswith('https://' or 'http://'):
-            client.messages['START_PHOTO'] = res.text
+            await client.settings.update_message_setting('START_PHOTO', res.text)
             return await query.message.edit_text("**This link has been set at the place of start photo!!**", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
         elif res.photo:
-            loc = await res.download()
-            client.messages['START_PHOTO'] = loc
+            # file_id, not a downloaded path: it is saved and used by every process and after redeploys
+            await client.settings.update_message_setting('START_PHOTO', res.photo.file_id)
             return await query.message.edit_text("**This image has been set as the starting image!!**", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
         else:
             return await query.message.edit_text("**Invalid Photo or Link format!!**\n__If you're sending the link of any image it must starts with either 'http' or 'https'!__", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
@@ -560,11 +560,11 @@ __Enter new link of fsub image or send the photo, or wait for 60 second timeout
     try:
         res = await client.listen(user_id=query.from_user.id, filters=(filters.text|filters.photo), timeout=60)
         if res.text and res.text.startswith('https://' or 'http://'):
-            client.messages['FSUB_PHOTO'] = res.text
+            await client.settings.update_message_setting('FSUB_PHOTO', res.text)
             return await query.message.edit_text("**This link has been set at the place of fsub photo!!**", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
         elif res.photo:
-            loc = await res.download()
-            client.messages['FSUB_PHOTO'] = loc
+            # file_id, not a downloaded path: it is saved and used by every process and after redeploys
+            await client.settings.update_message_setting('FSUB_PHOTO', res.photo.file_id)
             return await query.message.edit_text("**This image has been set as the force sub image!!**", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
         else:
             return await query.message.edit_text("**Invalid Photo or Link format!!**\n__If you're sending the link of any image it must starts with either 'http' or 'https'!__", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'photos')]]))
@@ -1,20 +1,13 @@
-import requests
-import random
-import string
 from config import SHORT_URL, SHORT_API, MESSAGES
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, InputMediaPhoto
 from pyrogram.errors.pyromod import ListenerTimeout
 from helper.helper_func import force_sub
+from helper.shortener import generate_random_alphanumeric
+from helper.tracing import traced
 
-# ✅ In-memory cache
-shortened_urls_cache = {}
-
-def generate_random_alphanumeric():
-    characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(8))
-
-def get_short(url, client, force_shorten=False):
+@traced("get_short")
+async def get_short(url, client, force_shorten=False):
     """
     Shorten a URL using the configured shortener service.
     
@@ -29,29 +22,12 @@ def get_short(url, client, force_shorten=False):
         if not shortner_enabled:
             return url  # Return original URL if shortner is disabled
 
-    # Step 2: Check cache
-    if url in shortened_urls_cache:
-        return shortened_urls_cache[url]
+    # Use dynamic shortner settings from client if available
+    short_url = getattr(client, 'short_url', SHORT_URL)
+    short_api = getattr(client, 'short_api', SHORT_API)
 
     try:
-        alias = generate_random_alphanumeric()
-        # Use dynamic shortner settings from client if available
-        short_url = getattr(client, 'short_url', SHORT_URL)
-        short_api = getattr(client, 'short_api', SHORT_API)
-        
-        api_url = f"https://{short_url}/api?api={short_api}&url={url}&alias={alias}"
-        response = requests.get(api_url)
-        rjson = response.json()
-
-        if rjson.get("status") == "success" and response.status_code == 200:
-            shortened_url = rjson.get("shortenedUrl", url)
-            # Validate that the shortened URL is a proper URL for Telegram buttons
-            if shortened_url and shortened_url.startswith(("https://", "http://")):
-                shortened_urls_cache[url] = shortened_url
-                return shortened_url
-            else:
-                print(f"[Shortener Warning] Invalid URL returned: {shortened_url}")
-                return url  # Return original if shortened URL is invalid
+        return await client.shortener.shorten(url, short_url, short_api)
     except Exception as e:
         print(f"[Shortener Error] {e}")
 
@@ -75,8 +51,8 @@ async def shortner_panel(client, query_or_message):
     # Check if shortner is working (only if enabled)
     if shortner_enabled:
         try:
-            test_response = requests.get(f"https://{short_url}/api?api={short_api}&url=https://google.com&alias=test", timeout=5)
-            status = "✓ ᴡᴏʀᴋɪɴɢ" if test_response.status_code == 200 else "✗ ɴᴏᴛ ᴡᴏʀᴋɪɴɢ"
+            status_code, _ = await client.shortener.request(short_url, short_api, "https://google.com", alias="test", timeout=5)
+            status = "✓ ᴡᴏʀᴋɪɴɢ" if status_code == 200 else "✗ ɴᴏᴛ ᴡᴏʀᴋɪɴɢ"
         except:
             status = "✗ ɴᴏᴛ ᴡᴏʀᴋɪɴɢ"
     else:
@@ -134,7 +110,7 @@ async def toggle_shortner(client: Client, query: CallbackQuery):
     client.shortner_enabled = new_status
     
     # Save to database
-    await client.mongodb.set_shortner_status(new_status)
+    await client.settings.update_shortner_setting('enabled', new_status)
     
     status_text = "ᴇɴᴀʙʟᴇᴅ" if new_status else "ᴅɪsᴀʙʟᴇᴅ"
     await query.answer(f"✓ ꜱʜᴏʀᴛɴᴇʀ {status_text}!")
@@ -181,8 +157,8 @@ __<blockquote>**≡ ꜱᴇɴᴅ ɴᴇᴡ ꜱʜᴏʀᴛɴᴇʀ ᴜʀʟ ᴀɴᴅ 
                 client.short_api = new_api
                 
                 # Save to database
-                await client.mongodb.update_shortner_setting('short_url', new_url)
-                await client.mongodb.update_shortner_setting('short_api', new_api)
+                await client.settings.update_shortner_setting('short_url', new_url)
+                await client.settings.update_shortner_setting('short_api', new_api)
                 
                 await query.message.edit_text(f"**✓ ꜱʜᴏʀᴛɴᴇʀ ꜱᴇᴛᴛɪɴɢꜱ ᴜᴘᴅᴀᴛᴇᴅ ꜱᴜᴄᴄᴇꜱꜱꜰᴜʟʟʏ!**\n\n**ɴᴇᴡ ᴜʀʟ:** `{new_url}`\n**ɴᴇᴡ ᴀᴘɪ:** `{new_api[:20]}...`", 
                                             reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'shortner')]]))
@@ -220,7 +196,7 @@ __ꜱᴇɴᴅ ᴛʜᴇ ɴᴇᴡ ᴛᴜᴛᴏʀɪᴀʟ ʟɪɴᴋ ɪɴ ᴛʜᴇ ɴ
         if new_tutorial and (new_tutorial.startswith('https://') or new_tutorial.startswith('http://')):
             client.tutorial_link = new_tutorial
             # Save to database
-            await client.mongodb.update_shortner_setting('tutorial_link', new_tutorial)
+            await client.settings.update_shortner_setting('tutorial_link', new_tutorial)
             await query.message.edit_text(f"**✓ ᴛᴜᴛᴏʀɪᴀʟ ʟɪɴᴋ ᴜᴘᴅᴀᴛᴇᴅ ꜱᴜᴄᴄᴇꜱꜱꜰᴜʟʟʏ!**", 
                                         reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton('◂ ʙᴀᴄᴋ', 'shortner')]]))
         else:
@@ -247,12 +223,9 @@ async def test_shortner(client: Client, query: CallbackQuery):
     try:
         test_url = "https://google.com"
         alias = generate_random_alphanumeric()
-        api_url = f"https://{short_url}/api?api={short_api}&url={test_url}&alias={alias}"
-        
-        response = requests.get(api_url, timeout=10)
-        rjson = response.json()
+        status_code, rjson = await client.shortener.request(short_url, short_api, test_url, alias=alias, timeout=10)
         
-        if rjson.get("status") == "success" and response.status_code == 200:
+        if rjson.get("status") == "success" and status_code == 200:
             short_link = rjson.get("shortenedUrl", "")
             msg = f"""**✅ ꜱʜᴏʀᴛɴᴇʀ ᴛᴇꜱᴛ ꜱᴜᴄᴄᴇꜱꜱꜰᴜʟ!**
 
@@ -263,7 +236,7 @@ async def test_shortner(client: Client, query: CallbackQuery):
             msg = f"""**❌ ꜱʜᴏʀᴛɴᴇʀ ᴛᴇꜱᴛ ꜰᴀɪʟᴇᴅ!**
 
 **ᴇʀʀᴏʀ:** `{rjson.get('message', 'Unknown error')}`
-**ꜱᴛᴀᴛᴜꜱ ᴄᴏᴅᴇ:** `{response.status_code}`"""
+**ꜱᴛᴀᴛᴜꜱ ᴄᴏᴅᴇ:** `{status_code}`"""
             
     except Exception as e:
         msg = f"**❌ ꜱʜᴏʀᴛɴᴇʀ ᴛᴇꜱᴛ ꜰᴀɪʟᴇᴅ!**\n\n**ᴇʀʀᴏʀ:** `{str(e)}`"
@@ -281,7 +254,7 @@ async def access_token_panel(client: Client, query: CallbackQuery):
     await query.answer()
     
     # Get access token settings
-    token_settings = await client.mongodb.get_access_token_settings()
+    token_settings = client.settings.access_token_settings()
     enabled = token_settings.get('enabled', False)
     validity_hours = token_settings.get('validity_hours', 12)
     renewed_count = await client.mongodb.get_renewed_users_count()
@@ -323,12 +296,12 @@ async def toggle_access_token(client: Client, query: CallbackQuery):
         return await query.answer('❌ ᴏɴʟʏ ᴀᴅᴍɪɴꜱ ᴄᴀɴ ᴜꜱᴇ ᴛʜɪꜱ!', show_alert=True)
     
     # Get current status and toggle
-    token_settings = await client.mongodb.get_access_token_settings()
+    token_settings = client.settings.access_token_settings()
     current_status = token_settings.get('enabled', False)
     new_status = not current_status
     
     # Update in database
-    await client.mongodb.update_access_token_setting('enabled', new_status)
+    await client.settings.update_access_token_setting('enabled', new_status)
     
     # Update client attribute
     client.access_token_enabled = new_status
@@ -349,7 +322,7 @@ async def set_token_validity(client: Client, query: CallbackQuery):
     
     await query.answer()
     
-    token_settings = await client.mongodb.get_access_token_settings()
+    token_settings = client.settings.access_token_settings()
     current_validity = token_settings.get('validity_hours', 12)
     
     msg = f"""<blockquote><b>Set Token Validity Period:</b></blockquote>
@@ -372,7 +345,7 @@ async def set_token_validity(client: Client, query: CallbackQuery):
             hours = int(hours_text)
             if 1 <= hours <= 720:
                 # Update in database
-                await client.mongodb.update_access_token_setting('validity_hours', hours)
+                await client.settings.update_access_token_setting('validity_hours', hours)
                 
                 # Update client attribute
                 client.access_token_validity = hours
@@ -400,7 +373,7 @@ async def token_stats(client: Client, query: CallbackQuery):
     await query.answer()
     
     # Get stats
-    token_settings = await client.mongodb.get_access_token_settings()
+    token_settings = client.settings.access_token_settings()
     enabled = token_settings.get('enabled', False)
     validity_hours = token_settings.get('validity_hours', 12)
     renewed_count = await client.mongodb.get_renewed_users_count()
@@ -4,7 +4,11 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 import humanize
 from config import MSG_EFFECT, OWNER_ID
 from plugins.shortner import get_short
-from helper.helper_func import get_messages, force_sub, decode, batch_auto_del_notification
+from helper.link_warmer import verification_url
+from helper.delivery import deliver_messages
+from helper.helper_func import get_messages, force_sub, get_user_context, batch_auto_del_notification
+from helper.links import decode_link
+from helper.tracing import span
 import asyncio
 
 #===============================================================#
@@ -14,17 +18,11 @@ import asyncio
 async def start_command(client: Client, message: Message):
     user_id = message.from_user.id
 
-    # 1. Add user if not present
-    present = await client.mongodb.present_user(user_id)
-    if not present:
-        try:
-            await client.mongodb.add_user(user_id)
-        except Exception as e:
-            client.LOGGER(__name__, client.name).warning(f"Error adding a user:\n{e}")
+    # 1. Add user if not present and load their state (already done by force_sub)
+    context = await get_user_context(client, message)
 
     # 2. Check if banned
-    is_banned = await client.mongodb.is_banned(user_id)
-    if is_banned:
+    if context["banned"]:
         return await message.reply("**You have been banned from using this bot!**")
 
     text = message.text
@@ -42,22 +40,22 @@ async def start_command(client: Client, message: Message):
             return await message.reply("Invalid command format.")
 
         # 3. Check premium status
-        is_user_pro = await client.mongodb.is_pro(user_id)
+        is_user_pro = context["is_pro"]
         
         # 4. Check if shortner is enabled (controls URL shortening for regular file access)
         shortner_enabled = getattr(client, 'shortner_enabled', True)
         
         # 5. Check Access Token feature (controls bot access - separate from shortner)
-        token_settings = await client.mongodb.get_access_token_settings()
+        token_settings = client.settings.access_token_settings()
         access_token_enabled = token_settings.get('enabled', False)
         validity_hours = token_settings.get('validity_hours', 12)
         
         # Check if user has valid access token
-        has_valid_access = await client.mongodb.check_user_access(user_id)
+        has_valid_access = context["has_access"]
         
-        # DEBUG: Log all conditions
-        client.LOGGER(__name__, client.name).info(f"[ACCESS DEBUG] user_id={user_id}, is_pro={is_user_pro}, is_owner={user_id == OWNER_ID}, is_short_link={is_short_link}")
-        client.LOGGER(__name__, client.name).info(f"[ACCESS DEBUG] access_token_enabled={access_token_enabled}, has_valid_access={has_valid_access}, shortner_enabled={shortner_enabled}")
+        # DEBUG: Log all conditions (set LOG_LEVELS["plugins.start"] = "DEBUG" to see them)
+        client.LOGGER(__name__, client.name).debug(f"[ACCESS DEBUG] user_id={user_id}, is_pro={is_user_pro}, is_owner={user_id == OWNER_ID}, is_short_link={is_short_link}")
+        client.LOGGER(__name__, client.name).debug(f"[ACCESS DEBUG] access_token_enabled={access_token_enabled}, has_valid_access={has_valid_access}, shortner_enabled={shortner_enabled}")
         
         # 6. If user came from verification link, grant access token (if access token feature is enabled)
         if is_short_link and access_token_enabled:
@@ -85,17 +83,17 @@ async def start_command(client: Client, message: Message):
                 use_shortener = True
                 client.LOGGER(__name__, client.name).info(f"Shortner enabled (no access token), sending shortlink to user {user_id}")
             else:
-                client.LOGGER(__name__, client.name).info(f"[ACCESS DEBUG] No verification needed - access_token_enabled={access_token_enabled}, has_valid_access={has_valid_access}")
+                client.LOGGER(__name__, client.name).debug(f"[ACCESS DEBUG] No verification needed - access_token_enabled={access_token_enabled}, has_valid_access={has_valid_access}")
             
             if needs_verification:
                 # Build the verification link
-                raw_link = f"https://t.me/{client.username}?start=yu3elk{base64_string}7"
+                raw_link = verification_url(client, base64_string)
                 
                 # Use shortener for Access Token verification (always for revenue)
                 if use_shortener:
                     try:
                         # force_shorten=True bypasses shortner_enabled check for Access Token
-                        verification_link = get_short(raw_link, client, force_shorten=True)
+                        verification_link = await get_short(raw_link, client, force_shorten=True)
                         # Check if shortener actually worked (didn't just return original URL)
                         if verification_link == raw_link:
                             client.LOGGER(__name__, client.name).warning(f"Shortener returned original URL, check shortner settings")
@@ -145,124 +143,18 @@ async def start_command(client: Client, message: Message):
 
         # 6. Decode and prepare file IDs
         try:
-            string = await decode(base64_string)
-            argument = string.split("-")
-            ids = []
-            source_channel_id = None
-
-            if len(argument) == 3:
-                # Try to determine source channel from encoded multiplier
-                encoded_start = int(argument[1])
-                encoded_end = int(argument[2])
-                
-                # Try primary channel first
-                primary_multiplier = abs(client.db)
-                start_primary = int(encoded_start / primary_multiplier)
-                end_primary = int(encoded_end / primary_multiplier)
-                
-                # Check if the division results in clean integers (meaning this channel was used for encoding)
-                if encoded_start % primary_multiplier == 0 and encoded_end % primary_multiplier == 0:
-                    source_channel_id = client.db
-                    start = start_primary
-                    end = end_primary
-                    client.LOGGER(__name__, client.name).info(f"Decoded batch from primary channel {source_channel_id}: {start}-{end}")
-                else:
-                    # Try secondary channels
-                    db_channels = getattr(client, 'db_channels', {})
-                    for channel_id_str in db_channels.keys():
-                        channel_id = int(channel_id_str)
-                        channel_multiplier = abs(channel_id)
-                        start_test = int(encoded_start / channel_multiplier)
-                        end_test = int(encoded_end / channel_multiplier)
-                        
-                        if encoded_start % channel_multiplier == 0 and encoded_end % channel_multiplier == 0:
-                            source_channel_id = channel_id
-                            start = start_test
-                            end = end_test
-                            client.LOGGER(__name__, client.name).info(f"Decoded batch from secondary channel {source_channel_id}: {start}-{end}")
-                            break
-                    
-                    # Fallback to primary if no match found
-                    if source_channel_id is None:
-                        source_channel_id = client.db
-                        start = start_primary
-                        end = end_primary
-                
-                ids = range(start, end + 1) if start <= end else list(range(start, end - 1, -1))
-
-            elif len(argument) == 2:
-                # Single message
-                encoded_msg = int(argument[1])
-                
-                # Try primary channel first
-                if hasattr(client, 'db_channel') and client.db_channel:
-                    primary_multiplier = abs(client.db_channel.id)
-                    msg_id_primary = int(encoded_msg / primary_multiplier)
-                    
-                    if encoded_msg % primary_multiplier == 0:
-                        source_channel_id = client.db_channel.id
-                        ids = [msg_id_primary]
-                    else:
-                        # Try secondary channels
-                        db_channels = getattr(client, 'db_channels', {})
-                        for channel_id_str in db_channels.keys():
-                            channel_id = int(channel_id_str)
-                            channel_multiplier = abs(channel_id)
-                            msg_id_test = int(encoded_msg / channel_multiplier)
-                            
-                            if encoded_msg % channel_multiplier == 0:
-                                source_channel_id = channel_id
-                                ids = [msg_id_test]
-                                break
-                        
-                        # Fallback to primary
-                        if source_channel_id is None:
-                            source_channel_id = client.db_channel.id if hasattr(client, 'db_channel') else client.db
-                            ids = [msg_id_primary]
-                else:
-                    # Fallback for legacy compatibility
-                    source_channel_id = client.db
-                    ids = [int(encoded_msg / abs(client.db))]
-
+            # The link names its DB channel, so no channel has to be guessed here
+            source_channel_id, ids = await decode_link(client, base64_string)
         except Exception as e:
             client.LOGGER(__name__, client.name).warning(f"Error decoding base64: {e}")
             return await message.reply("⚠️ Invalid or expired link.")
 
-        # 7. Get messages from the specific source channel first
+        # 7. Get messages, starting with the source channel decoded above
         temp_msg = await message.reply("Wait A Sec..")
-        messages = []
 
         try:
-            # Try to get messages from the identified source channel first
-            if source_channel_id:
-                client.LOGGER(__name__, client.name).info(f"Trying to get messages from source channel: {source_channel_id}")
-                try:
-                    msgs = await client.get_messages(
-                        chat_id=source_channel_id,
-                        message_ids=list(ids)
-                    )
-                    # Filter out None messages (deleted/not found)
-                    valid_msgs = [msg for msg in msgs if msg is not None]
-                    messages.extend(valid_msgs)
-                    client.LOGGER(__name__, client.name).info(f"Found {len(valid_msgs)} messages from source channel {source_channel_id}")
-                    
-                    # If we didn't get all messages, try the fallback system
-                    if len(valid_msgs) < len(list(ids)):
-                        missing_ids = [mid for mid in ids if mid not in {msg.id for msg in valid_msgs}]
-                        if missing_ids:
-                            client.LOGGER(__name__, client.name).info(f"Missing {len(missing_ids)} messages, trying fallback system")
-                            # Use the fallback system for missing messages
-                            additional_messages = await get_messages(client, missing_ids)
-                            messages.extend(additional_messages)
-                            client.LOGGER(__name__, client.name).info(f"Found {len(additional_messages)} additional messages from fallback")
-                except Exception as e:
-                    client.LOGGER(__name__, client.name).warning(f"Error getting messages from source channel {source_channel_id}: {e}")
-                    # Fallback to the multi-channel system
-                    messages = await get_messages(client, ids)
-            else:
-                client.LOGGER(__name__, client.name).info("No specific source channel identified, using multi-channel fallback")
-                # Use the multi-channel fallback system
-                messages = await get_messages(client, ids)
+            # Other DB channels are only asked (concurrently) for ids the source channel doesn't have
+            messages = await get_messages(client, list(ids), source_channel_id)
         except Exception as e:
             await temp_msg.edit_text("Something went wrong!")
             client.LOGGER(__name__, client.name).warning(f"Error getting messages: {e}")
@@ -272,51 +164,26 @@ async def start_command(client: Client, message: Message):
             return await temp_msg.edit("Couldn't find the files in the database.")
         await temp_msg.delete()
 
-        yugen_msgs = []
-        for msg in messages:
-            caption = (
-                client.messages.get('CAPTION', '').format(
-                    previouscaption=msg.caption.html if msg.caption else msg.document.file_name
-                ) if bool(client.messages.get('CAPTION', '')) and bool(msg.document)
-                else ("" if not msg.caption else msg.caption.html)
-            )
-            reply_markup = msg.reply_markup if not client.disable_btn else None
-
-            try:
-                copied_msg = await msg.copy(
-                    chat_id=message.from_user.id,
-                    caption=caption,
-                    reply_markup=reply_markup,
-                    protect_content=client.protect
-                )
-                yugen_msgs.append(copied_msg)
-            except FloodWait as e:
-                await asyncio.sleep(e.x)
-                copied_msg = await msg.copy(
-                    chat_id=message.from_user.id,
-                    caption=caption,
-                    reply_markup=reply_markup,
-                    protect_content=client.protect
-                )
-                yugen_msgs.append(copied_msg)
-            except Exception as e:
-                client.LOGGER(__name__, client.name).warning(f"Failed to send message: {e}")
-                pass
+        # Captions are rendered up front and files go out in ordered batches
+        async with span("deliver_messages"):
+            yugen_msgs = await deliver_messages(client, message.from_user.id, messages)
+        if len(yugen_msgs) < len(messages):
+            await message.reply(f"<b>{len(messages) - len(yugen_msgs)} of {len(messages)} files couldn't be sent right now. Please open the link again in a few minutes.</b>")
 
         # 8. Auto delete timer
         if messages and client.auto_del > 0:
             # Create transfer link for getting files again (original base64_string)
             transfer_link = original_payload
             
-            # Start batch auto delete notification - single notification for all files
-            asyncio.create_task(batch_auto_del_notification(
+            # Batch auto delete notification - single notification, deletion is scheduled persistently
+            await batch_auto_del_notification(
                 bot_username=client.username,
                 messages=yugen_msgs,
                 delay_time=client.auto_del,
                 transfer_link=transfer_link,
                 chat_id=message.from_user.id,
                 client=client
-            ))
+            )
         return
 
     # 9. Normal start message
@@ -32,7 +32,7 @@ async def start_txt(client: Client, query: CallbackQuery):
         text = ask_text.text
         if text == '0':
             return await ask_text.reply("__Start text has not changed!__")
-        client.messages['START'] = text
+        await client.settings.update_message_setting('START', text)
         await texts(client, query)
         return await ask_text.reply("__Start text has been changed!__")
     except Exception as e:
@@ -48,7 +48,7 @@ async def force_txt(client: Client, query: CallbackQuery):
         text = ask_text.text
         if text == '0':
             return await ask_text.reply("__Force Sub text has not changed!__")
-        client.messages['FSUB'] = text
+        await client.settings.update_message_setting('FSUB', text)
         await texts(client, query)
         return await ask_text.reply("__Force Sub text has been changed!__")
     except Exception as e:
@@ -64,7 +64,7 @@ async def about_txt(client: Client, query: CallbackQuery):
         text = ask_text.text
         if text == '0':
             return await ask_text.reply("__About text has not changed!__")
-        client.messages['ABOUT'] = text
+        await client.settings.update_message_setting('ABOUT', text)
         await texts(client, query)
         return await ask_text.reply("__About text has been changed!__")
     except Exception as e:
@@ -80,7 +80,7 @@ async def reply_txt(client: Client, query: CallbackQuery):
         text = ask_text.text
         if text == '0':
             return await ask_text.reply("__Reply text has not changed!__")
-        client.reply_text = text
+        await client.settings.update_message_setting('REPLY', text)
         await texts(client, query)
         return await ask_text.reply("__Reply text has been changed!__")
     except Exception as e: